@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Literal
 from pydantic import BaseSettings, AnyUrl
 
 
@@ -9,8 +10,24 @@ class Settings(BaseSettings):
     access_token_expire_minutes: int = 60 * 24 * 7
     algorithm: str = "HS256"
 
+    # Token -> principal cache and the bcrypt thread pool
+    auth_cache_max_entries: int = 10_000
+    auth_cache_ttl_seconds: float = 60.0
+    auth_hash_workers: int = 2
+
     sql_database_url: AnyUrl | str = "sqlite+aiosqlite:///./quitmath.db"
 
+    # Keyset pagination for history listings
+    page_size_default: int = 50
+    page_size_max: int = 200
+    # Encode list responses straight from column tuples (orjson when installed)
+    fast_json_enabled: bool = False
+
+    # Group-commit buffer for single-record POST /cravings and /tasks
+    write_buffer_enabled: bool = False
+    write_buffer_max_rows: int = 256
+    write_buffer_max_latency_ms: float = 5.0
+
     # ODE default parameters (can be user-specific in DB)
     alpha_c: float = 0.15
     beta_c: float = 0.35
@@ -23,6 +40,105 @@ class Settings(BaseSettings):
 
     tau_r: float = 2.0
 
+    # Per-user ODE calibration from logs, run as a periodic background job
+    calibration_enabled: bool = False
+    calibration_interval_seconds: float = 3600.0
+    calibration_window_days: int = 14
+    calibration_dt_minutes: float = 15.0
+    calibration_iterations: int = 10
+    calibration_prior_weight: float = 0.1
+    calibration_min_observations: int = 10
+    calibration_users_per_batch: int = 64
+    calibration_workers: int = 1
+    user_params_cache_max_entries: int = 10_000
+    user_params_cache_ttl_seconds: float = 300.0
+
+    # Online per-user latent-state filter fed by craving and task logs
+    state_process_noise: float = 1e-4
+    state_measurement_noise: float = 0.1
+    state_initial_variance: float = 0.25
+    state_max_substeps: int = 16
+    state_substep_minutes: float = 15.0
+
+    # Nightly Monte Carlo relapse forecast for every user with a latent state
+    forecast_enabled: bool = False
+    forecast_interval_seconds: float = 86400.0
+    forecast_days: int = 30
+    forecast_max_samples: int = 4096
+    forecast_ci_halfwidth: float = 0.02
+    forecast_workers: int = 0
+    forecast_users_per_page: int = 5000
+
+    # Proactive high-craving notifications: periodic cohort scan + outbox dispatch
+    notify_enabled: bool = False
+    notify_interval_seconds: float = 300.0
+    notify_page_size: int = 500
+    notify_active_days: int = 3
+    notify_lookahead_minutes: float = 60.0
+    notify_catchup_minutes: float = 360.0
+    notify_dt_minutes: float = 5.0
+    notify_threshold: float = 0.7
+    notify_min_interval_minutes: float = 180.0
+    notify_jitter_seconds: float = 120.0
+    notify_dispatch_batch: int = 500
+    notify_max_attempts: int = 5
+
+    # In-process cache for /rl/simulate and /rl/suggest-tasks results
+    rl_cache_max_entries: int = 1024
+    rl_cache_ttl_seconds: float = 300.0
+    rl_cache_state_step: float = 0.01
+
+    # /rl/live server-sent trajectory and schedule updates
+    live_max_connections_per_user: int = 3
+    live_refresh_seconds: float = 30.0
+    live_epsilon: float = 1e-3
+
+    # /analytics buckets and heatmaps, cached per user until their next log
+    analytics_max_buckets: int = 1000
+    analytics_cache_max_entries: int = 10_000
+    analytics_cache_ttl_seconds: float = 3600.0
+
+    # Task scheduling policy; "learned" loads a policy-gradient checkpoint,
+    # "optimizer" beam-searches task placements by batched simulation
+    rl_scheduler_policy: Literal["heuristic", "learned", "optimizer"] = "heuristic"
+    rl_policy_checkpoint_path: str | None = None
+    rl_optimizer_beam_width: int = 8
+    rl_optimizer_candidate_step_minutes: float = 5.0
+    rl_optimizer_difficulties: list[int] = [3, 5, 8]
+    rl_optimizer_task_minutes: float = 5.0
+    rl_optimizer_task_reward: float = 0.2
+    rl_optimizer_effort_weight: float = 0.1
+    rl_optimizer_budget_ms: float = 50.0
+
+    # Precomputed suggest-tasks policy table for the heuristic policy, built on
+    # the simulation pool at startup
+    rl_policy_table_enabled: bool = False
+    rl_policy_table_path: str | None = None
+    rl_policy_table_resolution: int = 21
+    rl_policy_table_verify: bool = False
+
+    # qpudatashard import/export
+    shard_chunk_rows: int = 1000
+    shard_default_region: str = "Unassigned"
+    shard_node_prefix: str = "QMC"
+
+    # Build the eco_totals rollup from the ledger at startup while it is empty.
+    # This blocks startup and every worker would race on the rebuild, so it is
+    # only for single-process deployments; otherwise run
+    # `python -m quitmath_backend.services.eco_totals --repair` once when
+    # upgrading a database that already has an eco_impacts ledger.
+    eco_totals_backfill_on_startup: bool = False
+
+    # Cohort eco projections (baseline used when no shard row matches)
+    eco_projection_parameter: str = "DisposableVapesPerUserPerYear"
+    eco_default_disposables_per_day: float = 1.0
+
+    # Off-loop simulation pool; requests beyond workers + queue get HTTP 429
+    sim_executor_kind: Literal["process", "thread"] = "process"
+    sim_executor_workers: int | None = None
+    sim_executor_max_queue: int = 32
+    sim_max_steps_per_request: int = 200_000
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -1,3 +1,6 @@
+from typing import Any
+
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
@@ -25,3 +28,16 @@ Base = declarative_base()
 async def get_db() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         yield session
+
+
+def dialect_insert(session: AsyncSession, model: Any):
+    """
+    INSERT construct for the session's dialect, for statements that need
+    ON CONFLICT clauses.
+    """
+    dialect = session.bind.dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise RuntimeError(f"ON CONFLICT inserts are not supported on {dialect}.")
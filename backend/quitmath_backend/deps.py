@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Annotated
 
@@ -11,11 +13,18 @@ from sqlalchemy import select
 from .config import get_settings
 from .database import get_db
 from .models import User
+from .services.principal_cache import Principal, get_principal_cache
 
 settings = get_settings()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt releases the GIL, so hashing on a small dedicated pool keeps the event
+# loop responsive while bounding how many CPUs a login storm can occupy.
+_hash_pool = ThreadPoolExecutor(
+    max_workers=settings.auth_hash_workers, thread_name_prefix="quitmath-bcrypt"
+)
+
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -25,6 +34,16 @@ def verify_password(password: str, hashed: str) -> bool:
     return pwd_context.verify(password, hashed)
 
 
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, hash_password, password)
+
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(
+        _hash_pool, verify_password, password, hashed
+    )
+
+
 def create_access_token(subject: str) -> str:
     expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
     to_encode = {"sub": subject, "exp": expire}
@@ -34,7 +53,16 @@ def create_access_token(subject: str) -> str:
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
     db: Annotated[AsyncSession, Depends(get_db)],
-) -> User:
+) -> Principal:
+    """
+    Resolves the bearer token to a Principal, served from the principal cache
+    when possible so most requests touch neither the JWT decoder nor the DB.
+    """
+    cache = get_principal_cache()
+    principal = cache.get(token)
+    if principal is not None:
+        return principal
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials.",
@@ -47,8 +75,10 @@ async def get_current_user(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    result = await db.execute(select(User).where(User.email == email))
-    user = result.scalars().first()
-    if user is None:
+    result = await db.execute(select(User.id, User.email).where(User.email == email))
+    row = result.first()
+    if row is None:
         raise credentials_exception
-    return user
+    principal = Principal(id=row.id, email=row.email)
+    cache.put(token, principal, token_expires_at=payload.get("exp"))
+    return principal
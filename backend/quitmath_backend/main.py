@@ -2,7 +2,14 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .config import get_settings
-from .routers import auth, cravings, tasks, eco, rl
+from .routers import auth, cravings, tasks, eco, rl, sync, sessions, shards, analytics
+from .services.calibration import get_calibration_scheduler
+from .services.eco_totals import backfill_if_empty
+from .services.notifications import get_notification_scheduler
+from .services.policy_table import get_policy_table_loader
+from .services.relapse_forecaster import get_forecast_scheduler
+from .services.sim_executor import get_simulation_executor
+from .services.write_buffer import get_write_buffer
 
 settings = get_settings()
 
@@ -27,6 +34,28 @@ def create_app() -> FastAPI:
     app.include_router(tasks.router, prefix=api_prefix)
     app.include_router(eco.router, prefix=api_prefix)
     app.include_router(rl.router, prefix=api_prefix)
+    app.include_router(sync.router, prefix=api_prefix)
+    app.include_router(sessions.router, prefix=api_prefix)
+    app.include_router(shards.router, prefix=api_prefix)
+    app.include_router(analytics.router, prefix=api_prefix)
+
+    if settings.rl_policy_table_enabled:
+        app.add_event_handler("startup", get_policy_table_loader().start)
+        app.add_event_handler("shutdown", get_policy_table_loader().stop)
+    app.add_event_handler("shutdown", get_simulation_executor().shutdown)
+    if settings.eco_totals_backfill_on_startup:
+        app.add_event_handler("startup", backfill_if_empty)
+    if settings.write_buffer_enabled:
+        app.add_event_handler("shutdown", get_write_buffer().close)
+    if settings.calibration_enabled:
+        app.add_event_handler("startup", get_calibration_scheduler().start)
+        app.add_event_handler("shutdown", get_calibration_scheduler().stop)
+    if settings.forecast_enabled:
+        app.add_event_handler("startup", get_forecast_scheduler().start)
+        app.add_event_handler("shutdown", get_forecast_scheduler().stop)
+    if settings.notify_enabled:
+        app.add_event_handler("startup", get_notification_scheduler().start)
+        app.add_event_handler("shutdown", get_notification_scheduler().stop)
 
     @app.get("/")
     async def root():
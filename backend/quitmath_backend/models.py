@@ -9,7 +9,9 @@ from sqlalchemy import (
     Enum,
     Float,
     ForeignKey,
+    Index,
     Integer,
+    JSON,
     String,
     Boolean,
     UniqueConstraint,
@@ -26,6 +28,7 @@ class User(Base):
     email: Mapped[str] = mapped_column(String(255), unique=True, index=True, nullable=False)
     hashed_password: Mapped[str] = mapped_column(String(255), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    region: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)  # e.g., "Phoenix-AZ"
 
     cravings: Mapped[list["CravingLog"]] = relationship("CravingLog", back_populates="user")
     tasks: Mapped[list["TaskLog"]] = relationship("TaskLog", back_populates="user")
@@ -34,12 +37,19 @@ class User(Base):
 
 class CravingLog(Base):
     __tablename__ = "craving_logs"
+    __table_args__ = (
+        Index("ix_craving_logs_user_timestamp", "user_id", "timestamp", "id"),
+        # Covers the /analytics aggregates, which then never read the table
+        Index("ix_craving_logs_user_timestamp_values", "user_id", "timestamp", "score", "attention"),
+        UniqueConstraint("user_id", "client_key", name="uq_craving_logs_user_client_key"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     timestamp: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
     score: Mapped[int] = mapped_column(Integer)  # 0–10
     attention: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    client_key: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)  # offline-sync idempotency key
 
     user: Mapped[User] = relationship("User", back_populates="cravings")
 
@@ -53,6 +63,12 @@ class TaskType(str, enum.Enum):
 
 class TaskLog(Base):
     __tablename__ = "task_logs"
+    __table_args__ = (
+        Index("ix_task_logs_user_started_at", "user_id", "started_at", "id"),
+        # Covers the /analytics aggregates, which then never read the table
+        Index("ix_task_logs_user_started_at_values", "user_id", "started_at", "success", "reward_delta"),
+        UniqueConstraint("user_id", "client_key", name="uq_task_logs_user_client_key"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
@@ -62,6 +78,7 @@ class TaskLog(Base):
     difficulty: Mapped[int] = mapped_column(Integer)  # 1–10
     success: Mapped[bool] = mapped_column(Boolean, default=False)
     reward_delta: Mapped[float] = mapped_column(Float, default=0.0)
+    client_key: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
 
     user: Mapped[User] = relationship("User", back_populates="tasks")
 
@@ -88,9 +105,20 @@ class DailySession(Base):
     smoked_today: Mapped[bool] = mapped_column(Boolean, default=False)
     abstinent_streak: Mapped[int] = mapped_column(Integer, default=0)
 
+    # Running sums behind the averages, maintained by DailyAggregator
+    craving_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    craving_count: Mapped[int] = mapped_column(Integer, default=0)
+    attention_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    attention_count: Mapped[int] = mapped_column(Integer, default=0)
+    reward_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    task_count: Mapped[int] = mapped_column(Integer, default=0)
+
 
 class EcoImpact(Base):
     __tablename__ = "eco_impacts"
+    __table_args__ = (
+        UniqueConstraint("user_id", "client_key", name="uq_eco_impacts_user_client_key"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
@@ -99,5 +127,116 @@ class EcoImpact(Base):
     unit: Mapped[str] = mapped_column(String(32))     # e.g., "units", "g", "kg"
     value: Mapped[float] = mapped_column(Float)
     karma: Mapped[float] = mapped_column(Float, default=0.0)
+    client_key: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
 
     user: Mapped[User] = relationship("User", back_populates="eco_impacts")
+
+
+class EcoTotal(Base):
+    # Per-user, per-metric rollup of eco_impacts, maintained by services.eco_totals
+    __tablename__ = "eco_totals"
+    __table_args__ = (
+        UniqueConstraint("user_id", "metric", name="uq_eco_totals_user_metric"),
+        Index("ix_eco_totals_metric_value", "metric", "total_value"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    metric: Mapped[str] = mapped_column(String(128))
+    total_value: Mapped[float] = mapped_column(Float, default=0.0)
+    total_karma: Mapped[float] = mapped_column(Float, default=0.0)
+    entries: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class EcoShardRow(Base):
+    # One row of an imported EcoNet qpudatashard CSV
+    __tablename__ = "eco_shard_rows"
+    __table_args__ = (
+        UniqueConstraint("nodeid", "parameter", "period", name="uq_eco_shard_rows_node_parameter_period"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    source: Mapped[str] = mapped_column(String(255), index=True)
+    nodeid: Mapped[str] = mapped_column(String(128))
+    category: Mapped[str] = mapped_column(String(128))
+    region: Mapped[str] = mapped_column(String(128), index=True)
+    parameter: Mapped[str] = mapped_column(String(128))
+    unit: Mapped[str] = mapped_column(String(32))
+    baselinevalue: Mapped[float] = mapped_column(Float)
+    improvedvalue: Mapped[float] = mapped_column(Float)
+    period: Mapped[date] = mapped_column(Date)
+    ecoimpactscore: Mapped[float] = mapped_column(Float)
+    karmaperunit: Mapped[float] = mapped_column(Float)
+    notes: Mapped[str] = mapped_column(String(1024), default="")
+
+
+class UserODEParams(Base):
+    # Per-user calibrated ODE parameters, written by services.calibration
+    __tablename__ = "user_ode_params"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    alpha_c: Mapped[float] = mapped_column(Float)
+    beta_c: Mapped[float] = mapped_column(Float)
+    gamma_c: Mapped[float] = mapped_column(Float)
+    delta_c: Mapped[float] = mapped_column(Float)
+    lambda_a: Mapped[float] = mapped_column(Float)
+    eta_a: Mapped[float] = mapped_column(Float)
+    kappa_a: Mapped[float] = mapped_column(Float)
+    tau_r: Mapped[float] = mapped_column(Float)
+    cost: Mapped[float] = mapped_column(Float)  # RMS residual of the fit
+    n_observations: Mapped[int] = mapped_column(Integer)
+    fitted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class UserLatentState(Base):
+    # Latest filtered (C, A, R) estimate per user, written by services.state_estimator
+    __tablename__ = "user_latent_states"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    c: Mapped[float] = mapped_column(Float)
+    a: Mapped[float] = mapped_column(Float)
+    r: Mapped[float] = mapped_column(Float)
+    # Upper triangle of the 3x3 covariance
+    p_cc: Mapped[float] = mapped_column(Float)
+    p_ca: Mapped[float] = mapped_column(Float)
+    p_cr: Mapped[float] = mapped_column(Float)
+    p_aa: Mapped[float] = mapped_column(Float)
+    p_ar: Mapped[float] = mapped_column(Float)
+    p_rr: Mapped[float] = mapped_column(Float)
+    updated_at: Mapped[datetime] = mapped_column(DateTime)  # time the estimate refers to
+
+
+class NotificationOutbox(Base):
+    # Pending and delivered push notifications, written and drained by services.notifications
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        Index("ix_notification_outbox_status_send_after", "status", "send_after"),
+        Index("ix_notification_outbox_user_created", "user_id", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    kind: Mapped[str] = mapped_column(String(32))  # e.g., "high_craving"
+    predicted_craving: Mapped[float] = mapped_column(Float)
+    peak_at: Mapped[datetime] = mapped_column(DateTime)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    send_after: Mapped[datetime] = mapped_column(DateTime)
+    status: Mapped[str] = mapped_column(String(16), default="pending")  # pending, sent, failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+
+
+class UserRelapseForecast(Base):
+    # Latest relapse forecast per user, written nightly by services.relapse_forecaster
+    __tablename__ = "user_relapse_forecasts"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    start_date: Mapped[date] = mapped_column(Date)  # relapse_prob[0] is for this day
+    # Per-day cumulative relapse probability and its 95% band
+    relapse_prob: Mapped[list[float]] = mapped_column(JSON)
+    relapse_lower: Mapped[list[float]] = mapped_column(JSON)
+    relapse_upper: Mapped[list[float]] = mapped_column(JSON)
+    expected_streak_days: Mapped[float] = mapped_column(Float)
+    samples: Mapped[int] = mapped_column(Integer)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
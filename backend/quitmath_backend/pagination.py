@@ -0,0 +1,69 @@
+import base64
+from datetime import datetime
+from typing import Any, Sequence
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import Select, tuple_
+
+from .config import get_settings
+from .schemas import UtcDateTime
+
+settings = get_settings()
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams:
+    """
+    Keyset pagination and time-range query parameters for history listings.
+
+    Pages are ordered newest first on (timestamp, id). The cursor for the next
+    page is returned in the X-Next-Cursor response header and is absent on
+    the last page.
+    """
+
+    def __init__(
+        self,
+        limit: int = Query(default=settings.page_size_default, ge=1, le=settings.page_size_max),
+        cursor: str | None = Query(default=None, description="Value of X-Next-Cursor from the previous page."),
+        since: UtcDateTime | None = Query(default=None, description="Inclusive lower time bound."),
+        until: UtcDateTime | None = Query(default=None, description="Exclusive upper time bound."),
+    ) -> None:
+        self.limit = limit
+        self.cursor = cursor
+        self.since = since
+        self.until = until
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts_raw, id_raw = base64.urlsafe_b64decode(padded).decode("utf-8").rsplit("|", 1)
+        return datetime.fromisoformat(ts_raw), int(id_raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def apply_keyset(stmt: Select, ts_col: Any, id_col: Any, page: PageParams) -> Select:
+    if page.since is not None:
+        stmt = stmt.where(ts_col >= page.since)
+    if page.until is not None:
+        stmt = stmt.where(ts_col < page.until)
+    if page.cursor is not None:
+        stmt = stmt.where(tuple_(ts_col, id_col) < tuple_(*decode_cursor(page.cursor)))
+    # One extra row tells us whether another page exists.
+    return stmt.order_by(ts_col.desc(), id_col.desc()).limit(page.limit + 1)
+
+
+def finish_page(rows: Sequence[Any], page: PageParams, response: Response, ts_attr: str) -> list[Any]:
+    rows = list(rows)
+    if len(rows) > page.limit:
+        rows = rows[: page.limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(last, ts_attr), last.id)
+    return rows
@@ -0,0 +1,45 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import get_db
+from ..schemas import AnalyticsBucketsRead, AnalyticsHeatmapRead, UtcDateTime
+from ..deps import get_current_user
+from ..services.analytics import BucketSize, InvalidAnalyticsRange, get_analytics_service
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+# Local time zone of the charts, as minutes east of UTC
+UtcOffset = Query(0, ge=-14 * 60, le=14 * 60)
+
+
+@router.get("/buckets", response_model=AnalyticsBucketsRead)
+async def craving_task_buckets(
+    bucket: BucketSize = "day",
+    since: Optional[UtcDateTime] = None,
+    until: Optional[UtcDateTime] = None,
+    utc_offset_minutes: int = UtcOffset,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    try:
+        body = await get_analytics_service().buckets(db, user.id, bucket, since, until, utc_offset_minutes)
+    except InvalidAnalyticsRange as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc))
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/heatmap", response_model=AnalyticsHeatmapRead)
+async def craving_heatmap(
+    since: Optional[UtcDateTime] = None,
+    until: Optional[UtcDateTime] = None,
+    utc_offset_minutes: int = UtcOffset,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    try:
+        body = await get_analytics_service().heatmap(db, user.id, since, until, utc_offset_minutes)
+    except InvalidAnalyticsRange as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc))
+    return Response(content=body, media_type="application/json")
@@ -8,7 +8,7 @@ from sqlalchemy import select
 from ..database import get_db
 from ..models import User
 from ..schemas import UserCreate, UserRead, Token
-from ..deps import hash_password, verify_password, create_access_token
+from ..deps import hash_password_async, verify_password_async, create_access_token
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -23,8 +23,9 @@ async def register_user(
         raise HTTPException(status_code=400, detail="Email already registered.")
     user = User(
         email=payload.email,
-        hashed_password=hash_password(payload.password),
+        hashed_password=await hash_password_async(payload.password),
         created_at=datetime.utcnow(),
+        region=payload.region,
     )
     db.add(user)
     await db.commit()
@@ -39,7 +40,7 @@ async def login_for_access_token(
 ):
     result = await db.execute(select(User).where(User.email == form_data.username))
     user = result.scalars().first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password.",
@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Depends
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from ..config import get_settings
 from ..database import get_db
 from ..models import CravingLog
 from ..schemas import CravingLogCreate, CravingLogRead
 from ..deps import get_current_user
+from ..pagination import PageParams, apply_keyset, finish_page
+from ..serialization import COLUMNAR_RESPONSE, ListLayout, rows_response, schema_columns, use_fast_path
+from ..services.daily_aggregator import DailyDelta, get_daily_aggregator
+from ..services.live_updates import get_live_hub
+from ..services.state_estimator import StateEvent, get_state_estimator
+from ..services.write_buffer import get_write_buffer
 
+settings = get_settings()
 router = APIRouter(prefix="/cravings", tags=["cravings"])
 
 
@@ -18,22 +28,42 @@ async def log_craving(
 ):
     log = CravingLog(
         user_id=user.id,
-        timestamp=payload.timestamp,
+        timestamp=payload.timestamp or datetime.utcnow(),
         score=payload.score,
         attention=payload.attention,
     )
+    if settings.write_buffer_enabled:
+        # Return the request's connection to the pool before waiting on the
+        # group commit, which needs one of its own.
+        await db.close()
+        return await get_write_buffer().submit(log)
     db.add(log)
+    await get_daily_aggregator().apply(db, [DailyDelta.from_log(log)])
+    await get_state_estimator().apply(db, [StateEvent.from_log(log)])
     await db.commit()
+    get_live_hub().publish([user.id])
     await db.refresh(log)
     return log
 
 
-@router.get("", response_model=list[CravingLogRead])
+@router.get("", response_model=list[CravingLogRead], responses=COLUMNAR_RESPONSE)
 async def list_cravings(
+    response: Response,
+    page: PageParams = Depends(),
+    layout: ListLayout = "objects",
     db: AsyncSession = Depends(get_db),
     user=Depends(get_current_user),
 ):
-    result = await db.execute(
-        select(CravingLog).where(CravingLog.user_id == user.id).order_by(CravingLog.timestamp.desc())
+    fast = use_fast_path(layout)
+    columns = schema_columns(CravingLogRead, CravingLog) if fast else [CravingLog]
+    stmt = apply_keyset(
+        select(*columns).where(CravingLog.user_id == user.id),
+        CravingLog.timestamp,
+        CravingLog.id,
+        page,
     )
-    return list(result.scalars().all())
+    result = await db.execute(stmt)
+    if fast:
+        rows = finish_page(result.all(), page, response, "timestamp")
+        return rows_response(CravingLogRead, rows, layout, response)
+    return finish_page(result.scalars().all(), page, response, "timestamp")
@@ -1,12 +1,24 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 
 from ..database import get_db
-from ..models import EcoImpact
-from ..schemas import EcoImpactCreate, EcoImpactRead
-from ..services.eco_impact import EcoImpactService
+from ..models import EcoImpact, EcoTotal
+from ..schemas import (
+    EcoImpactCreate,
+    EcoImpactRead,
+    EcoLeaderboardEntry,
+    EcoProjectionRead,
+    EcoProjectionRequest,
+    EcoTotalRead,
+)
+from ..services.eco_impact import EcoCoefficients, EcoImpactService
+from ..services.eco_projection import EcoProjector
+from ..services.eco_totals import add_to_totals
 from ..deps import get_current_user
+from ..serialization import COLUMNAR_RESPONSE, ListLayout, rows_response, use_fast_path
 
 router = APIRouter(prefix="/eco", tags=["eco"])
 
@@ -25,6 +37,7 @@ async def log_manual_eco(
         karma=0.0,
     )
     db.add(eco)
+    await add_to_totals(db, [(user.id, eco.metric, eco.value, eco.karma)])
     await db.commit()
     await db.refresh(eco)
     return eco
@@ -70,26 +83,73 @@ async def log_disposable_avoidance(
     db.add(eco_co2)
     records.append(eco_co2)
 
+    await add_to_totals(db, [(user.id, r.metric, r.value, r.karma) for r in records])
     await db.commit()
     for rec in records:
         await db.refresh(rec)
     return records
 
 
-@router.get("/summary")
+@router.get("/summary", response_model=list[EcoTotalRead], responses=COLUMNAR_RESPONSE)
 async def eco_summary(
+    layout: ListLayout = "objects",
     db: AsyncSession = Depends(get_db),
     user=Depends(get_current_user),
 ):
     result = await db.execute(
-        select(
-            EcoImpact.metric,
-            func.sum(EcoImpact.value),
-            func.sum(EcoImpact.karma),
-        ).where(EcoImpact.user_id == user.id).group_by(EcoImpact.metric)
+        select(EcoTotal.metric, EcoTotal.total_value, EcoTotal.total_karma)
+        .where(EcoTotal.user_id == user.id)
+        .order_by(EcoTotal.metric)
     )
-    rows = result.all()
+    if use_fast_path(layout):
+        return rows_response(EcoTotalRead, result.all(), layout)
     return [
-        {"metric": m, "total_value": float(v or 0.0), "total_karma": float(k or 0.0)}
-        for m, v, k in rows
+        {"metric": m, "total_value": float(v), "total_karma": float(k)}
+        for m, v, k in result.all()
     ]
+
+
+@router.get("/leaderboard", response_model=list[EcoLeaderboardEntry], responses=COLUMNAR_RESPONSE)
+async def eco_leaderboard(
+    metric: Optional[str] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    layout: ListLayout = "objects",
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    Top users by total value of one metric, or by karma summed across all
+    metrics when no metric is given. Reads only the eco_totals rollup. Only
+    ranks and totals are returned; is_you marks the caller's own row.
+    """
+    if metric is not None:
+        total = EcoTotal.total_value
+        stmt = select(EcoTotal.user_id, total).where(EcoTotal.metric == metric)
+    else:
+        total = func.sum(EcoTotal.total_karma)
+        stmt = select(EcoTotal.user_id, total).group_by(EcoTotal.user_id)
+    result = await db.execute(stmt.order_by(total.desc(), EcoTotal.user_id).limit(limit))
+    ranked = [(i + 1, float(t), u == user.id) for i, (u, t) in enumerate(result.all())]
+    if use_fast_path(layout):
+        return rows_response(EcoLeaderboardEntry, ranked, layout)
+    return [{"rank": rank, "total": t, "is_you": is_you} for rank, t, is_you in ranked]
+
+
+@router.post("/projection", response_model=EcoProjectionRead)
+async def eco_projection(
+    payload: EcoProjectionRequest,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    Projects avoided disposables, plastic, battery mass, CO2e and karma for
+    every user in a region (or all users) up to a target date, once per
+    coefficient scenario.
+    """
+    projection = await EcoProjector().project(
+        db,
+        until=payload.until,
+        region=payload.region,
+        scenarios=[EcoCoefficients(**s.model_dump()) for s in payload.scenarios],
+    )
+    return projection
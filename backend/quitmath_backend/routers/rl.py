@@ -1,40 +1,454 @@
-from fastapi import APIRouter, Depends
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Annotated, AsyncIterator, Iterator, Literal
 
-from ..schemas import ODESimulateRequest, ODESimulateResponse, ODESimulatePoint
-from ..services.ode_engine import CravingODEEngine
-from ..services.rl_scheduler import RLScheduler
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import Response, StreamingResponse
+from pydantic import Field
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..database import AsyncSessionLocal, get_db
+from ..schemas import (
+    LatentStateRead,
+    ODESimulateColumns,
+    ODESimulatePoint,
+    ODESimulateRequest,
+    ODESimulateResponse,
+)
+from ..services.live_updates import LiveLimitExceeded, LiveTrajectory, get_live_hub, sse_event
+from ..services.ode_engine import CravingODEEngine, ODEParams, decimate_trajectory
+from ..services.policy_table import get_policy_table
+from ..services.rl_scheduler import RLScheduler, RLSchedulerConfig
+from ..services.sim_executor import (
+    ComputeBudgetExceeded,
+    ExecutorOverloaded,
+    get_simulation_executor,
+)
+from ..services.state_estimator import get_state_estimator
+from ..services.trajectory_cache import get_trajectory_cache, params_fingerprint
+from ..services.user_params import load_user_params
 from ..deps import get_current_user
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/rl", tags=["rl"])
 
+_NDJSON_CHUNK_ROWS = 4096
+
+
+def _simulate_arrays(
+    params: ODEParams,
+    c0: float,
+    a0: float,
+    r0: float,
+    horizon_minutes: float,
+    dt_minutes: float,
+    method: str,
+    max_points: int | None,
+    downsample: str,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # Runs inside the simulation pool, so it must stay a picklable module-level
+    # function. Decimating here keeps the pickled result as small as the reply.
+    t, c, a, r = CravingODEEngine(params).simulate(
+        c0=c0,
+        a0=a0,
+        r0=r0,
+        horizon_minutes=horizon_minutes,
+        dt_minutes=dt_minutes,
+        method=method,
+    )
+    if max_points is not None:
+        t, c, a, r = decimate_trajectory(t, c, a, r, max_points, downsample)
+    return t, c, a, r
+
+
+def _ndjson_rows(
+    t: np.ndarray,
+    c: np.ndarray,
+    a: np.ndarray,
+    r: np.ndarray,
+) -> Iterator[bytes]:
+    for start in range(0, t.shape[0], _NDJSON_CHUNK_ROWS):
+        stop = start + _NDJSON_CHUNK_ROWS
+        rows = zip(t[start:stop].tolist(), c[start:stop].tolist(), a[start:stop].tolist(), r[start:stop].tolist())
+        yield "".join(
+            f'{{"t_min":{ti!r},"c":{ci!r},"a":{ai!r},"r":{ri!r}}}\n' for ti, ci, ai, ri in rows
+        ).encode("utf-8")
+
+
+def _suggest_offsets(
+    params: ODEParams,
+    config: RLSchedulerConfig,
+    c0: float,
+    a0: float,
+    r0: float,
+) -> list[int]:
+    return RLScheduler(params, config).suggest_task_schedule(c0=c0, a0=a0, r0=r0)
+
+
+def _suggest_plan(
+    params: ODEParams,
+    config: RLSchedulerConfig,
+    c0: float,
+    a0: float,
+    r0: float,
+) -> list[tuple[int, int]]:
+    return RLScheduler(params, config).suggest_task_plan(c0=c0, a0=a0, r0=r0)
+
+
+async def _run_simulation(fn, *args, n_steps: int):
+    executor = get_simulation_executor()
+    try:
+        executor.check_budget(n_steps)
+        return await executor.run(fn, *args)
+    except ComputeBudgetExceeded as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc))
+    except ExecutorOverloaded as exc:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(exc),
+            headers={"Retry-After": "1"},
+        )
+
 
-@router.post("/simulate", response_model=ODESimulateResponse)
+async def _cached_trajectory(
+    params: ODEParams,
+    c0: float,
+    a0: float,
+    r0: float,
+    horizon_minutes: float,
+    dt_minutes: float,
+    method: str,
+    max_points: int | None = None,
+    downsample: str = "stride",
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    cache = get_trajectory_cache()
+    c0, a0, r0 = (cache.quantize(v) for v in (c0, a0, r0))
+    key = (
+        "simulate",
+        c0,
+        a0,
+        r0,
+        horizon_minutes,
+        dt_minutes,
+        method,
+        max_points,
+        downsample,
+        params_fingerprint(params),
+    )
+    arrays = cache.get(key)
+    if arrays is None:
+        arrays = await _run_simulation(
+            _simulate_arrays,
+            params,
+            c0,
+            a0,
+            r0,
+            horizon_minutes,
+            dt_minutes,
+            method,
+            max_points,
+            downsample,
+            n_steps=int(horizon_minutes / dt_minutes) + 1,
+        )
+        cache.put(key, arrays)
+    return arrays
+
+
+async def _cached_offsets(params: ODEParams, c: float, a: float, r: float) -> list[int]:
+    config = RLSchedulerConfig()
+    # The table is precomputed for the heuristic under the default dynamics only.
+    use_table = config.policy == "heuristic" and params == ODEParams()
+    table = get_policy_table() if use_table else None
+    if table is not None:
+        offsets = table.lookup(c, a, r)
+        if get_settings().rl_policy_table_verify:
+            live = RLScheduler().suggest_task_schedule(c0=c, a0=a, r0=r)
+            if live != offsets:
+                logger.warning(
+                    "Policy table disagrees with heuristic at (%.4f, %.4f, %.4f): %s != %s",
+                    c, a, r, offsets, live,
+                )
+        return offsets
+
+    if config.policy == "learned":
+        # One small matrix product; not worth a cache entry or a pool hop.
+        return RLScheduler(params, config).suggest_task_schedule(c0=c, a0=a, r0=r)
+
+    cache = get_trajectory_cache()
+    c0, a0, r0 = (cache.quantize(v) for v in (c, a, r))
+    key = (
+        "suggest",
+        c0,
+        a0,
+        r0,
+        config.horizon_minutes,
+        config.dt_minutes,
+        params_fingerprint(params, config),
+    )
+    offsets = cache.get(key)
+    if offsets is None:
+        offsets = await _run_simulation(
+            _suggest_offsets,
+            params,
+            config,
+            c0,
+            a0,
+            r0,
+            n_steps=int(config.horizon_minutes / config.dt_minutes) + 1,
+        )
+        cache.put(key, offsets)
+    return offsets
+
+
+async def _cached_plan(
+    params: ODEParams,
+    config: RLSchedulerConfig,
+    c: float,
+    a: float,
+    r: float,
+) -> list[tuple[int, int]]:
+    cache = get_trajectory_cache()
+    c0, a0, r0 = (cache.quantize(v) for v in (c, a, r))
+    key = ("plan", c0, a0, r0, params_fingerprint(params, config))
+    plan = cache.get(key)
+    if plan is None:
+        plan = await _run_simulation(
+            _suggest_plan,
+            params,
+            config,
+            c0,
+            a0,
+            r0,
+            n_steps=int(config.horizon_minutes / config.dt_minutes) + 1,
+        )
+        cache.put(key, plan)
+    return plan
+
+
+@router.post(
+    "/simulate",
+    response_model=ODESimulateResponse | ODESimulateColumns,
+    responses={
+        200: {
+            "description": "Point list by default, parallel arrays for format=columnar, "
+            "or one ODESimulatePoint per line for format=ndjson.",
+            "content": {"application/x-ndjson": {}},
+        }
+    },
+)
 async def simulate_ode(
     payload: ODESimulateRequest,
+    db: AsyncSession = Depends(get_db),
     user=Depends(get_current_user),
 ):
-    engine = CravingODEEngine()
-    t, c, a, r = engine.simulate(
-        c0=payload.c0,
-        a0=payload.a0,
-        r0=payload.r0,
-        horizon_minutes=payload.horizon_minutes,
-        dt_minutes=payload.dt_minutes,
+    params = await load_user_params(db, user.id)
+    arrays = await _cached_trajectory(
+        params,
+        payload.c0,
+        payload.a0,
+        payload.r0,
+        payload.horizon_minutes,
+        payload.dt_minutes,
+        payload.method,
+        payload.max_points,
+        payload.downsample,
     )
+    t, c, a, r = arrays
+
+    if payload.format == "ndjson":
+        return StreamingResponse(_ndjson_rows(t, c, a, r), media_type="application/x-ndjson")
+    if payload.format == "columnar":
+        body = json.dumps(
+            {"t_min": t.tolist(), "c": c.tolist(), "a": a.tolist(), "r": r.tolist()},
+            separators=(",", ":"),
+        )
+        return Response(content=body, media_type="application/json")
+
     points = [
-        ODESimulatePoint(t_min=float(ti), c=float(ci), a=float(ai), r=float(ri))
-        for ti, ci, ai, ri in zip(t, c, a, r)
+        ODESimulatePoint(t_min=ti, c=ci, a=ai, r=ri)
+        for ti, ci, ai, ri in zip(t.tolist(), c.tolist(), a.tolist(), r.tolist())
     ]
     return ODESimulateResponse(points=points)
 
 
 @router.get("/suggest-tasks")
 async def suggest_tasks(
-    c: float,
-    a: float,
-    r: float,
+    c: float | None = None,
+    a: float | None = None,
+    r: float | None = None,
+    difficulties: list[Annotated[int, Field(ge=1, le=10)]] | None = Query(default=None),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    Suggests task start offsets from (c, a, r), or from the server-side
+    latent-state estimate when all three are omitted. Under the optimizer
+    policy the chosen difficulty of each task is returned too, and
+    difficulties limits the ones it may choose from.
+    """
+    config = RLSchedulerConfig()
+    if difficulties and config.policy != "optimizer":
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="difficulties is only supported by the optimizer policy.",
+        )
+    params = await load_user_params(db, user.id)
+    supplied = [v is not None for v in (c, a, r)]
+    if any(supplied) and not all(supplied):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Pass all of c, a and r, or none to use the estimated state.",
+        )
+    if not any(supplied):
+        estimate = await get_state_estimator().current(db, user.id)
+        if estimate is None:
+            raise HTTPException(status_code=404, detail="No logs to estimate a state from yet.")
+        c, a, r = estimate.x.tolist()
+    if config.policy == "optimizer":
+        if difficulties:
+            config.optimizer_difficulties = tuple(sorted(set(difficulties)))
+        plan = await _cached_plan(params, config, c, a, r)
+        return {
+            "minute_offsets": [offset for offset, _ in plan],
+            "difficulties": [difficulty for _, difficulty in plan],
+        }
+    return {"minute_offsets": await _cached_offsets(params, c, a, r)}
+
+
+@router.get("/state", response_model=LatentStateRead)
+async def latent_state(
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    estimate = await get_state_estimator().current(db, user.id)
+    if estimate is None:
+        raise HTTPException(status_code=404, detail="No logs to estimate a state from yet.")
+    c, a, r = estimate.x.tolist()
+    c_std, a_std, r_std = np.sqrt(np.clip(np.diag(estimate.cov), 0.0, None)).tolist()
+    return LatentStateRead(as_of=estimate.at, c=c, a=a, r=r, c_std=c_std, a_std=a_std, r_std=r_std)
+
+
+async def _live_events(user_id: int, live: LiveTrajectory, horizon_minutes: int, method: str) -> list[bytes]:
+    async with AsyncSessionLocal() as session:
+        params = await load_user_params(session, user_id)
+        start = live.next_index(datetime.utcnow())
+        estimate = await get_state_estimator().current(session, user_id, now=live.time_at(start))
+    if estimate is None:
+        return []
+
+    c0, a0, r0 = estimate.x.tolist()
+    _, c, a, r = await _cached_trajectory(params, c0, a0, r0, horizon_minutes, live.dt_minutes, method)
+    events = []
+    points = live.diff(start, np.column_stack([c, a, r]))
+    if points:
+        events.append(
+            sse_event(
+                "trajectory",
+                {
+                    "origin": live.origin.isoformat(),
+                    "dt_minutes": live.dt_minutes,
+                    "start": start,
+                    "end": start + c.shape[0],
+                    "points": points,
+                },
+            )
+        )
+    offsets = await _cached_offsets(params, c0, a0, r0)
+    if offsets != live.offsets:
+        live.offsets = offsets
+        events.append(
+            sse_event("schedule", {"as_of": live.time_at(start).isoformat(), "minute_offsets": offsets})
+        )
+    return events
+
+
+async def _live_stream(
+    user_id: int,
+    live: LiveTrajectory,
+    horizon_minutes: int,
+    method: str,
+) -> AsyncIterator[bytes]:
+    # Subscribing here rather than in the endpoint ties the slot to the
+    # generator's finally, which only runs once iteration has started.
+    try:
+        wake = get_live_hub().subscribe(user_id)
+    except LiveLimitExceeded as exc:
+        yield sse_event("error", {"detail": str(exc)})
+        return
+    refresh = get_settings().live_refresh_seconds
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=refresh)
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+            try:
+                events = await _live_events(user_id, live, horizon_minutes, method)
+            except HTTPException as exc:
+                events = [sse_event("error", {"detail": exc.detail})]
+            for event in events:
+                yield event
+            if not events:
+                yield b": keepalive\n\n"
+    finally:
+        get_live_hub().unsubscribe(user_id, wake)
+
+
+@router.get(
+    "/live",
+    responses={
+        200: {
+            "description": "Server-sent events: 'trajectory' with the points that changed on an "
+            "absolute grid from 'origin', and 'schedule' with revised task offsets.",
+            "content": {"text/event-stream": {}},
+        }
+    },
+)
+async def live_updates(
+    horizon_minutes: int = Query(default=60, ge=5, le=1440),
+    dt_minutes: float = Query(default=1.0, gt=0.0, le=60.0),
+    method: Literal["euler", "exact", "adaptive"] = "exact",
+    user=Depends(get_current_user),
+):
+    """
+    Streams the caller's predicted trajectory and suggested tasks, recomputed
+    from the latent-state estimate whenever they log a craving or task (and
+    every live_refresh_seconds). Each update sends only new points and points
+    that moved, and log bursts while a send is in flight collapse into one
+    update.
+    """
+    try:
+        get_simulation_executor().check_budget(int(horizon_minutes / dt_minutes) + 1)
+    except ComputeBudgetExceeded as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc))
+    try:
+        get_live_hub().check(user.id)
+    except LiveLimitExceeded as exc:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(exc))
+
+    live = LiveTrajectory(datetime.utcnow(), dt_minutes, get_settings().live_epsilon)
+    return StreamingResponse(
+        _live_stream(user.id, live, horizon_minutes, method),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/cache-stats")
+async def cache_stats(
+    user=Depends(get_current_user),
+):
+    return get_trajectory_cache().stats()
+
+
+@router.get("/executor-stats")
+async def executor_stats(
     user=Depends(get_current_user),
 ):
-    scheduler = RLScheduler()
-    offsets = scheduler.suggest_task_schedule(c0=c, a0=a, r0=r)
-    return {"minute_offsets": offsets}
+    return get_simulation_executor().stats()
@@ -0,0 +1,53 @@
+from datetime import date
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+
+from ..database import get_db
+from ..models import DailySession, UserRelapseForecast
+from ..schemas import DailySessionRead, RelapseForecastRead
+from ..deps import get_current_user
+
+router = APIRouter(prefix="/sessions", tags=["sessions"])
+
+
+@router.get("/latest", response_model=DailySessionRead)
+async def latest_session(
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    session = await db.scalar(
+        select(DailySession)
+        .where(DailySession.user_id == user.id)
+        .order_by(DailySession.date.desc())
+        .limit(1)
+    )
+    if session is None:
+        raise HTTPException(status_code=404, detail="No daily sessions yet.")
+    return session
+
+
+@router.get("/forecast", response_model=RelapseForecastRead)
+async def relapse_forecast(
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    forecast = await db.get(UserRelapseForecast, user.id)
+    if forecast is None:
+        raise HTTPException(status_code=404, detail="No relapse forecast yet.")
+    return forecast
+
+
+@router.get("/{day}", response_model=DailySessionRead)
+async def session_for_day(
+    day: date,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    session = await db.scalar(
+        select(DailySession).where(DailySession.user_id == user.id, DailySession.date == day)
+    )
+    if session is None:
+        raise HTTPException(status_code=404, detail="No session for that day.")
+    return session
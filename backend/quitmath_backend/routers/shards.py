@@ -0,0 +1,33 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from ..config import get_settings
+from ..deps import get_current_user
+from ..schemas import UtcDateTime
+from ..services.qpudatashard import stream_shard_csv
+
+settings = get_settings()
+router = APIRouter(prefix="/shards", tags=["shards"])
+
+# Importing replaces the cohort-wide eco_shard_rows behind /eco/projection, so
+# it is an operator task: python -m quitmath_backend.services.qpudatashard import <csv>
+
+
+@router.get("/export")
+async def export_shard(
+    period: Literal["year", "month"] = "year",
+    since: Optional[UtcDateTime] = None,
+    until: Optional[UtcDateTime] = None,
+    user=Depends(get_current_user),
+):
+    """
+    Streams eco-impact aggregates per region, period and metric as an EcoNet
+    qpudatashard CSV.
+    """
+    return StreamingResponse(
+        stream_shard_csv(period, since, until, chunk_rows=settings.shard_chunk_rows),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="QuitMathCompanion-{period}.csv"'},
+    )
@@ -0,0 +1,144 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import dialect_insert, get_db
+from ..models import CravingLog, EcoImpact, TaskLog
+from ..schemas import (
+    CravingSyncItem,
+    EcoSyncItem,
+    SyncBatchRequest,
+    SyncBatchResponse,
+    SyncItemResult,
+    TaskSyncItem,
+)
+from ..deps import get_current_user
+from ..services.daily_aggregator import DailyDelta, get_daily_aggregator
+from ..services.eco_totals import EcoEntry, add_to_totals
+from ..services.live_updates import get_live_hub
+from ..services.state_estimator import StateEvent, get_state_estimator
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+
+def _craving_row(item: CravingSyncItem, user_id: int, now: datetime) -> dict:
+    return {
+        "user_id": user_id,
+        "client_key": item.idempotency_key,
+        "timestamp": item.timestamp or now,
+        "score": item.score,
+        "attention": item.attention,
+    }
+
+
+def _task_row(item: TaskSyncItem, user_id: int, now: datetime) -> dict:
+    completed_at = item.completed_at or item.started_at or now
+    return {
+        "user_id": user_id,
+        "client_key": item.idempotency_key,
+        "started_at": item.started_at or completed_at,
+        "completed_at": completed_at,
+        "task_type": item.task_type,
+        "difficulty": item.difficulty,
+        "success": item.success,
+        "reward_delta": item.reward_delta,
+    }
+
+
+def _eco_row(item: EcoSyncItem, user_id: int, now: datetime) -> dict:
+    return {
+        "user_id": user_id,
+        "client_key": item.idempotency_key,
+        "timestamp": item.timestamp or now,
+        "metric": item.metric,
+        "unit": item.unit,
+        "value": item.value,
+        "karma": 0.0,
+    }
+
+
+_KINDS = {
+    "craving": (CravingLog, _craving_row),
+    "task": (TaskLog, _task_row),
+    "eco": (EcoImpact, _eco_row),
+}
+
+
+@router.post("/batch", response_model=SyncBatchResponse)
+async def sync_batch(
+    payload: SyncBatchRequest,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    Ingests a mixed batch of offline records in one transaction. Each kind is
+    written with a single multi-row INSERT ... ON CONFLICT DO NOTHING
+    RETURNING, so records whose idempotency key was already stored (e.g. from
+    a retried upload) are skipped and reported as duplicates with their
+    existing id. A record held back by a concurrent request that has not
+    committed yet is reported as "retry" without an id. Newly created
+    records update the user's daily sessions, latent-state estimate and eco
+    totals in the same transaction.
+    """
+    now = datetime.utcnow()
+    ids: dict[tuple[str, str], tuple[str, int]] = {}
+    deltas: list[DailyDelta | None] = []
+    events: list[StateEvent | None] = []
+    eco_entries: list[EcoEntry] = []
+
+    for kind, (model, to_row) in _KINDS.items():
+        rows: dict[str, dict] = {}
+        for item in payload.items:
+            if item.kind == kind:
+                rows.setdefault(item.idempotency_key, to_row(item, user.id, now))
+        if not rows:
+            continue
+
+        stmt = (
+            dialect_insert(db, model)
+            .values(list(rows.values()))
+            .on_conflict_do_nothing(index_elements=["user_id", "client_key"])
+            .returning(model.id, model.client_key)
+        )
+        for row_id, key in (await db.execute(stmt)).all():
+            ids[(kind, key)] = ("created", row_id)
+            row = rows[key]
+            if model is EcoImpact:
+                eco_entries.append((user.id, row["metric"], row["value"], row["karma"]))
+            else:
+                deltas.append(DailyDelta.from_row(model, row))
+                events.append(StateEvent.from_row(model, row))
+
+        missing = [key for key in rows if (kind, key) not in ids]
+        if missing:
+            existing = await db.execute(
+                select(model.id, model.client_key).where(
+                    model.user_id == user.id, model.client_key.in_(missing)
+                )
+            )
+            for row_id, key in existing.all():
+                ids[(kind, key)] = ("duplicate", row_id)
+
+    await get_daily_aggregator().apply(db, deltas)
+    await get_state_estimator().apply(db, events)
+    await add_to_totals(db, eco_entries)
+    await db.commit()
+    if deltas:
+        get_live_hub().publish([user.id])
+
+    results = []
+    reported: set[tuple[str, str]] = set()
+    for item in payload.items:
+        key = (item.kind, item.idempotency_key)
+        # A key another request inserted concurrently may not be visible yet;
+        # the client resends it and gets the stored id as a duplicate.
+        status, row_id = ids.get(key, ("retry", None))
+        if key in reported and status != "retry":
+            status = "duplicate"
+        reported.add(key)
+        results.append(
+            SyncItemResult(idempotency_key=item.idempotency_key, kind=item.kind, status=status, id=row_id)
+        )
+    return SyncBatchResponse(results=results)
@@ -1,14 +1,22 @@
 from datetime import datetime
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from ..config import get_settings
 from ..database import get_db
 from ..models import TaskLog
 from ..schemas import TaskLogCreate, TaskLogRead
 from ..deps import get_current_user
+from ..pagination import PageParams, apply_keyset, finish_page
+from ..serialization import COLUMNAR_RESPONSE, ListLayout, rows_response, schema_columns, use_fast_path
+from ..services.daily_aggregator import DailyDelta, get_daily_aggregator
+from ..services.live_updates import get_live_hub
+from ..services.state_estimator import StateEvent, get_state_estimator
+from ..services.write_buffer import get_write_buffer
 
+settings = get_settings()
 router = APIRouter(prefix="/tasks", tags=["tasks"])
 
 
@@ -28,18 +36,38 @@ async def log_task(
         success=payload.success,
         reward_delta=payload.reward_delta,
     )
+    if settings.write_buffer_enabled:
+        # Return the request's connection to the pool before waiting on the
+        # group commit, which needs one of its own.
+        await db.close()
+        return await get_write_buffer().submit(task)
     db.add(task)
+    await get_daily_aggregator().apply(db, [DailyDelta.from_log(task)])
+    await get_state_estimator().apply(db, [StateEvent.from_log(task)])
     await db.commit()
+    get_live_hub().publish([user.id])
     await db.refresh(task)
     return task
 
 
-@router.get("", response_model=list[TaskLogRead])
+@router.get("", response_model=list[TaskLogRead], responses=COLUMNAR_RESPONSE)
 async def list_tasks(
+    response: Response,
+    page: PageParams = Depends(),
+    layout: ListLayout = "objects",
     db: AsyncSession = Depends(get_db),
     user=Depends(get_current_user),
 ):
-    result = await db.execute(
-        select(TaskLog).where(TaskLog.user_id == user.id).order_by(TaskLog.started_at.desc())
+    fast = use_fast_path(layout)
+    columns = schema_columns(TaskLogRead, TaskLog) if fast else [TaskLog]
+    stmt = apply_keyset(
+        select(*columns).where(TaskLog.user_id == user.id),
+        TaskLog.started_at,
+        TaskLog.id,
+        page,
     )
-    return list(result.scalars().all())
+    result = await db.execute(stmt)
+    if fast:
+        rows = finish_page(result.all(), page, response, "started_at")
+        return rows_response(TaskLogRead, rows, layout, response)
+    return finish_page(result.scalars().all(), page, response, "started_at")
@@ -1,20 +1,33 @@
-from datetime import datetime, date
-from typing import Optional
+from datetime import datetime, date, timezone
+from typing import Annotated, Literal, Optional, Union
 
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import AfterValidator, BaseModel, EmailStr, Field
 
 from .models import TaskType, DailyState
 
 
+def to_naive_utc(value: datetime) -> datetime:
+    # Timestamps are stored and compared as naive UTC; naive input is taken as UTC.
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+# Incoming timestamps: any offset is accepted and converted to naive UTC
+UtcDateTime = Annotated[datetime, AfterValidator(to_naive_utc)]
+
+
 class UserCreate(BaseModel):
     email: EmailStr
     password: str = Field(min_length=8)
+    region: Optional[str] = Field(default=None, max_length=64)
 
 
 class UserRead(BaseModel):
     id: int
     email: EmailStr
     created_at: datetime
+    region: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -26,7 +39,7 @@ class Token(BaseModel):
 
 
 class CravingLogCreate(BaseModel):
-    timestamp: Optional[datetime] = None
+    timestamp: Optional[UtcDateTime] = None
     score: int = Field(ge=0, le=10)
     attention: Optional[int] = Field(default=None, ge=0, le=10)
 
@@ -74,6 +87,19 @@ class DailySessionRead(BaseModel):
         from_attributes = True
 
 
+class RelapseForecastRead(BaseModel):
+    start_date: date
+    relapse_prob: list[float]
+    relapse_lower: list[float]
+    relapse_upper: list[float]
+    expected_streak_days: float
+    samples: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 class EcoImpactCreate(BaseModel):
     metric: str
     unit: str
@@ -92,12 +118,110 @@ class EcoImpactRead(BaseModel):
         from_attributes = True
 
 
+class EcoTotalRead(BaseModel):
+    metric: str
+    total_value: float
+    total_karma: float
+
+
+class EcoLeaderboardEntry(BaseModel):
+    rank: int
+    total: float
+    is_you: bool  # other users are not identified
+
+
+class EcoCoefficientsIn(BaseModel):
+    plastic_per_disposable_g: float = Field(default=15.0, ge=0.0)
+    battery_per_disposable_g: float = Field(default=10.0, ge=0.0)
+    co2e_per_disposable_kg: float = Field(default=0.02, ge=0.0)
+    karma_per_gram: float = Field(default=0.0005, ge=0.0)
+    karma_per_kg_co2e: float = Field(default=1.0, ge=0.0)
+
+    class Config:
+        from_attributes = True
+
+
+class EcoProjectionRequest(BaseModel):
+    until: date
+    region: Optional[str] = None
+    scenarios: list[EcoCoefficientsIn] = Field(default_factory=list, max_length=256)
+
+
+class EcoScenarioProjection(BaseModel):
+    coefficients: EcoCoefficientsIn
+    plastic_g: float
+    battery_g: float
+    co2e_kg: float
+    karma: float
+
+    class Config:
+        from_attributes = True
+
+
+class EcoProjectionRead(BaseModel):
+    region: Optional[str]
+    until: date
+    users: int
+    disposables_per_day: float
+    karma_per_unit: float
+    avoided_units_to_date: float
+    avoided_units_projected: float
+    shard_karma: float
+    scenarios: list[EcoScenarioProjection]
+
+    class Config:
+        from_attributes = True
+
+
+class CravingSyncItem(CravingLogCreate):
+    kind: Literal["craving"]
+    idempotency_key: str = Field(min_length=1, max_length=64)
+
+
+class TaskSyncItem(TaskLogCreate):
+    kind: Literal["task"]
+    idempotency_key: str = Field(min_length=1, max_length=64)
+    started_at: Optional[UtcDateTime] = None
+    completed_at: Optional[UtcDateTime] = None
+
+
+class EcoSyncItem(EcoImpactCreate):
+    kind: Literal["eco"]
+    idempotency_key: str = Field(min_length=1, max_length=64)
+    timestamp: Optional[UtcDateTime] = None
+
+
+SyncItem = Annotated[
+    Union[CravingSyncItem, TaskSyncItem, EcoSyncItem],
+    Field(discriminator="kind"),
+]
+
+
+class SyncBatchRequest(BaseModel):
+    items: list[SyncItem] = Field(min_length=1, max_length=1000)
+
+
+class SyncItemResult(BaseModel):
+    idempotency_key: str
+    kind: Literal["craving", "task", "eco"]
+    status: Literal["created", "duplicate", "retry"]
+    id: Optional[int] = None
+
+
+class SyncBatchResponse(BaseModel):
+    results: list[SyncItemResult]
+
+
 class ODESimulateRequest(BaseModel):
     c0: float = Field(ge=0.0, le=1.0)
     a0: float = Field(ge=0.0, le=1.0)
     r0: float = Field(ge=0.0, le=1.0)
     horizon_minutes: int = Field(ge=5, le=1440)
     dt_minutes: float = Field(gt=0.0, le=60.0)
+    method: Literal["euler", "exact", "adaptive"] = "euler"
+    format: Literal["points", "columnar", "ndjson"] = "points"
+    max_points: Optional[int] = Field(default=None, ge=2, le=100_000)
+    downsample: Literal["stride", "minmax"] = "stride"
 
 
 class ODESimulatePoint(BaseModel):
@@ -109,3 +233,46 @@ class ODESimulatePoint(BaseModel):
 
 class ODESimulateResponse(BaseModel):
     points: list[ODESimulatePoint]
+
+
+class ODESimulateColumns(BaseModel):
+    t_min: list[float]
+    c: list[float]
+    a: list[float]
+    r: list[float]
+
+
+class LatentStateRead(BaseModel):
+    as_of: datetime
+    c: float
+    a: float
+    r: float
+    # Standard deviations from the filter covariance
+    c_std: float
+    a_std: float
+    r_std: float
+
+
+class AnalyticsBucketsRead(BaseModel):
+    bucket: Literal["hour", "day", "week"]
+    start: datetime  # UTC start of bucket 0
+    step_minutes: int
+    utc_offset_minutes: int
+    # One entry per non-empty bucket; bucket i starts at start + i * step_minutes
+    index: list[int]
+    craving_mean: list[Optional[float]]
+    craving_max: list[Optional[int]]
+    attention_mean: list[Optional[float]]
+    craving_count: list[int]
+    task_count: list[int]
+    task_success_rate: list[Optional[float]]
+    reward_sum: list[float]
+
+
+class AnalyticsHeatmapRead(BaseModel):
+    since: datetime
+    until: Optional[datetime]
+    utc_offset_minutes: int
+    # 7 x 24 grids: local weekday (Monday first) by local hour of day
+    craving_mean: list[list[Optional[float]]]
+    craving_count: list[list[int]]
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import math
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Literal
+
+from sqlalchemy import BigInteger, Integer, and_, cast, extract, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import ColumnElement
+
+from ..config import get_settings
+from ..models import CravingLog, TaskLog
+from ..serialization import dumps
+from .trajectory_cache import TrajectoryCache
+
+BucketSize = Literal["hour", "day", "week"]
+
+BUCKET_SECONDS: dict[str, int] = {"hour": 3600, "day": 86_400, "week": 604_800}
+# Window used when since is omitted, counted back from the current bucket
+DEFAULT_BUCKETS: dict[str, int] = {"hour": 48, "day": 90, "week": 52}
+HEATMAP_DEFAULT_DAYS = 90
+
+_EPOCH = datetime(1970, 1, 1)
+# 1970-01-01 was a Thursday; shifting by three days starts weeks on Monday.
+_MONDAY_SHIFT = 3 * 86_400
+
+
+class InvalidAnalyticsRange(ValueError):
+    pass
+
+
+def local_seconds(dialect: str, column: Any, offset_seconds: int) -> ColumnElement:
+    """
+    Whole seconds since the epoch of a naive UTC timestamp column, moved into
+    the caller's time zone, as an integer SQL expression. Integer division
+    and modulo of it give bucket, weekday and hour numbers on both backends.
+    """
+    if dialect == "sqlite":
+        seconds = cast(func.strftime("%s", column), Integer)
+    elif dialect == "postgresql":
+        seconds = cast(func.floor(extract("epoch", column)), BigInteger)
+    else:
+        raise RuntimeError(f"Analytics bucketing is not supported on {dialect}.")
+    return seconds + offset_seconds
+
+
+def _round(value: float | None, digits: int = 2) -> float | None:
+    return round(float(value), digits) if value is not None else None
+
+
+def _naive_utc(value: datetime | None) -> datetime | None:
+    # Logs are stored as naive UTC, and cache keys must not depend on how the
+    # caller spelled the offset.
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class AnalyticsService:
+    """
+    Time-bucketed craving and task aggregates for charts.
+
+    Buckets are computed in SQL by integer division of each log's local epoch
+    seconds, grouped over the covering (user_id, time, values...) indexes so
+    only index pages are read. Results are returned as compact columnar JSON
+    over the non-empty buckets and cached per user, query and watermark: the
+    user's highest craving and task log ids. Logs are never updated in place,
+    so a new watermark is the only way a result can go stale, and one
+    two-row index lookup per request decides whether the cached bytes are
+    still valid.
+    """
+
+    def __init__(self, cache: TrajectoryCache, max_buckets: int = 1000) -> None:
+        self.cache = cache
+        self.max_buckets = max_buckets
+
+    async def watermark(self, session: AsyncSession, user_id: int) -> tuple[int, int]:
+        row = (
+            await session.execute(
+                select(
+                    select(func.max(CravingLog.id)).where(CravingLog.user_id == user_id).scalar_subquery(),
+                    select(func.max(TaskLog.id)).where(TaskLog.user_id == user_id).scalar_subquery(),
+                )
+            )
+        ).one()
+        return row[0] or 0, row[1] or 0
+
+    def window(
+        self,
+        bucket: BucketSize,
+        since: datetime | None,
+        until: datetime | None,
+        utc_offset_minutes: int,
+        now: datetime | None = None,
+    ) -> tuple[int, datetime]:
+        """
+        Index of the first bucket and its UTC start. since is moved back to
+        its bucket's boundary, so every returned bucket is complete.
+        """
+        width = BUCKET_SECONDS[bucket]
+        shift = utc_offset_minutes * 60 + (_MONDAY_SHIFT if bucket == "week" else 0)
+        now = now or datetime.utcnow()
+        if since is None:
+            first = (self._seconds(now) + shift) // width - DEFAULT_BUCKETS[bucket] + 1
+        else:
+            first = (self._seconds(since) + shift) // width
+        start = _EPOCH + timedelta(seconds=first * width - shift)
+        end = until or now
+        if end <= start:
+            raise InvalidAnalyticsRange("until must be after since.")
+        count = math.ceil((end - start).total_seconds() / width)
+        if count > self.max_buckets:
+            raise InvalidAnalyticsRange(
+                f"{count} {bucket} buckets requested; at most {self.max_buckets} are allowed."
+            )
+        return first, start
+
+    async def buckets(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        bucket: BucketSize,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        utc_offset_minutes: int = 0,
+    ) -> bytes:
+        since, until = _naive_utc(since), _naive_utc(until)
+        first, start = self.window(bucket, since, until, utc_offset_minutes)
+        key = ("buckets", user_id, bucket, start, until, utc_offset_minutes, await self.watermark(session, user_id))
+        body = self.cache.get(key)
+        if body is None:
+            body = dumps(await self._buckets(session, user_id, bucket, first, start, until, utc_offset_minutes))
+            self.cache.put(key, body)
+        return body
+
+    async def heatmap(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        utc_offset_minutes: int = 0,
+    ) -> bytes:
+        since, until = _naive_utc(since), _naive_utc(until)
+        if since is None:
+            # Whole local days, so the key only changes at midnight.
+            shift = utc_offset_minutes * 60
+            today = (self._seconds(datetime.utcnow()) + shift) // 86_400
+            since = _EPOCH + timedelta(seconds=(today - HEATMAP_DEFAULT_DAYS + 1) * 86_400 - shift)
+        if until is not None and until <= since:
+            raise InvalidAnalyticsRange("until must be after since.")
+        key = ("heatmap", user_id, since, until, utc_offset_minutes, await self.watermark(session, user_id))
+        body = self.cache.get(key)
+        if body is None:
+            body = dumps(await self._heatmap(session, user_id, since, until, utc_offset_minutes))
+            self.cache.put(key, body)
+        return body
+
+    async def _buckets(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        bucket: BucketSize,
+        first: int,
+        start: datetime,
+        until: datetime | None,
+        utc_offset_minutes: int,
+    ) -> dict[str, Any]:
+        dialect = session.bind.dialect.name
+        width = BUCKET_SECONDS[bucket]
+        shift = utc_offset_minutes * 60 + (_MONDAY_SHIFT if bucket == "week" else 0)
+
+        craving_bucket = (local_seconds(dialect, CravingLog.timestamp, shift) // width).label("bucket")
+        cravings = await session.execute(
+            select(
+                craving_bucket,
+                func.avg(CravingLog.score),
+                func.max(CravingLog.score),
+                func.avg(CravingLog.attention),
+                func.count(),
+            )
+            .where(self._range(CravingLog.user_id, CravingLog.timestamp, user_id, start, until))
+            .group_by(craving_bucket)
+        )
+        task_bucket = (local_seconds(dialect, TaskLog.started_at, shift) // width).label("bucket")
+        tasks = await session.execute(
+            select(
+                task_bucket,
+                func.count(),
+                func.sum(cast(TaskLog.success, Integer)),
+                func.sum(TaskLog.reward_delta),
+            )
+            .where(self._range(TaskLog.user_id, TaskLog.started_at, user_id, start, until))
+            .group_by(task_bucket)
+        )
+
+        by_bucket: dict[int, list[Any]] = {}
+        for index, mean, peak, attention, count in cravings:
+            by_bucket[index] = [_round(mean), peak, _round(attention), count, 0, None, 0.0]
+        for index, count, successes, reward in tasks:
+            row = by_bucket.setdefault(index, [None, None, None, 0, 0, None, 0.0])
+            row[4:] = [count, _round((successes or 0) / count, 3), _round(reward or 0.0, 3)]
+
+        indices = sorted(by_bucket)
+        columns = list(zip(*(by_bucket[i] for i in indices))) or [()] * 7
+        names = (
+            "craving_mean",
+            "craving_max",
+            "attention_mean",
+            "craving_count",
+            "task_count",
+            "task_success_rate",
+            "reward_sum",
+        )
+        payload: dict[str, Any] = {
+            "bucket": bucket,
+            "start": start,
+            "step_minutes": width // 60,
+            "utc_offset_minutes": utc_offset_minutes,
+            "index": [i - first for i in indices],
+        }
+        payload.update((name, list(values)) for name, values in zip(names, columns))
+        return payload
+
+    async def _heatmap(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        since: datetime,
+        until: datetime | None,
+        utc_offset_minutes: int,
+    ) -> dict[str, Any]:
+        seconds = local_seconds(session.bind.dialect.name, CravingLog.timestamp, utc_offset_minutes * 60)
+        weekday = ((seconds // 86_400 + 3) % 7).label("weekday")
+        hour = (seconds // 3600 % 24).label("hour")
+        rows = await session.execute(
+            select(weekday, hour, func.avg(CravingLog.score), func.count())
+            .where(self._range(CravingLog.user_id, CravingLog.timestamp, user_id, since, until))
+            .group_by(weekday, hour)
+        )
+        mean: list[list[float | None]] = [[None] * 24 for _ in range(7)]
+        count = [[0] * 24 for _ in range(7)]
+        for day, hour_of_day, avg_score, n in rows:
+            mean[day][hour_of_day] = _round(avg_score)
+            count[day][hour_of_day] = n
+        return {
+            "since": since,
+            "until": until,
+            "utc_offset_minutes": utc_offset_minutes,
+            "craving_mean": mean,
+            "craving_count": count,
+        }
+
+    @staticmethod
+    def _seconds(at: datetime) -> int:
+        return math.floor((at - _EPOCH).total_seconds())
+
+    @staticmethod
+    def _range(user_column: Any, time_column: Any, user_id: int, since: datetime, until: datetime | None):
+        clauses = [user_column == user_id, time_column >= since]
+        if until is not None:
+            clauses.append(time_column < until)
+        return and_(*clauses)
+
+
+@lru_cache
+def get_analytics_service() -> AnalyticsService:
+    settings = get_settings()
+    cache = TrajectoryCache(
+        max_entries=settings.analytics_cache_max_entries,
+        ttl_seconds=settings.analytics_cache_ttl_seconds,
+    )
+    return AnalyticsService(cache, max_buckets=settings.analytics_max_buckets)
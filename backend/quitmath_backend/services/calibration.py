@@ -0,0 +1,445 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import astuple, dataclass, field, fields
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Iterable, Sequence
+
+import numpy as np
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..database import AsyncSessionLocal, dialect_insert
+from ..models import CravingLog, TaskLog, UserODEParams
+from .ode_engine import CravingODEEngine, ODEParams, SparseInputs
+from .rl_scheduler import RLSchedulerConfig
+from .trajectory_cache import get_trajectory_cache, params_fingerprint
+from .user_params import get_user_params_cache, row_to_params
+
+logger = logging.getLogger(__name__)
+
+_PARAM_NAMES = tuple(f.name for f in fields(ODEParams))
+# Fits run on log-parameters so every rate stays positive; tau_r is in minutes.
+_LOG_LOWER = np.log([1e-4, 1e-4, 1e-4, 1e-4, 1e-4, 1e-4, 1e-4, 0.05])
+_LOG_UPPER = np.log([5.0, 5.0, 5.0, 5.0, 5.0, 5.0, 5.0, 1440.0])
+_DEFAULT_A0 = 0.5
+_START_ALPHA_SCALES = (1.0, 0.5, 0.25, 0.1)
+
+
+@dataclass
+class CalibrationConfig:
+    window_days: int = 14
+    dt_minutes: float = 15.0
+    iterations: int = 10
+    prior_weight: float = 0.1
+    fd_step: float = 1e-4
+    min_observations: int = 10
+    users_per_batch: int = 64
+    workers: int = 1
+
+
+@dataclass
+class CalibrationProblem:
+    """
+    One user's fitting data, in minutes from their first craving log in the
+    window: C observations from scores, A observations from attention, task
+    inputs, and the warm-start parameters that also anchor the prior.
+    """
+
+    user_id: int
+    x0: tuple[float, float, float]
+    horizon_minutes: float
+    c_obs: list[tuple[float, float]]
+    a_obs: list[tuple[float, float]]
+    inputs: SparseInputs = field(default_factory=SparseInputs)
+    warm_start: ODEParams = field(default_factory=ODEParams)
+
+
+def task_inputs(tasks: Iterable[Any], origin: datetime) -> SparseInputs:
+    """
+    Builds ODE inputs from task log rows: u = difficulty / 10 while a task is
+    running and a reward_delta pulse at completed_at.
+    """
+    u_segments: list[tuple[float, float]] = []
+    reward_events: list[tuple[float, float]] = []
+    for task in tasks:
+        if task.completed_at is None:
+            continue
+        start_min = (task.started_at - origin).total_seconds() / 60.0
+        end_min = (task.completed_at - origin).total_seconds() / 60.0
+        if end_min > start_min:
+            u_segments.append((start_min, task.difficulty / 10.0))
+            u_segments.append((end_min, 0.0))
+        if task.reward_delta:
+            reward_events.append((end_min, float(task.reward_delta)))
+    return SparseInputs(u_segments=u_segments, reward_events=reward_events)
+
+
+@dataclass
+class CalibrationResult:
+    user_id: int
+    params: ODEParams
+    cost: float
+    n_observations: int
+
+
+def fit_problems(
+    problems: Sequence[CalibrationProblem],
+    config: CalibrationConfig,
+) -> list[CalibrationResult]:
+    """
+    Fits ODEParams for a batch of users with Levenberg-Marquardt on
+    log-parameters, regularized toward each user's warm start by
+    prior_weight. Each user starts from the best of the warm start and a few
+    variants of it with a weaker craving drift.
+
+    Every iteration evaluates each user's candidate plus one forward-difference
+    lane per parameter in a single simulate_batch(method="exact") call, so the
+    Jacobians of the whole batch come from one vectorized simulation and the
+    normal equations are solved as one stacked (N, P, P) system. Candidates
+    that do not lower a user's cost are rejected and that user's damping is
+    raised. Runs in a worker process, so it is a module-level function.
+    """
+    n_users, n_params = len(problems), len(_PARAM_NAMES)
+    dt = config.dt_minutes
+    n_steps = int(np.ceil(max(p.horizon_minutes for p in problems) / dt)) + 1
+    horizon = (n_steps - 1) * dt
+    t = np.linspace(0.0, horizon, n_steps)
+
+    u = np.zeros((n_users, n_steps))
+    reward = np.zeros((n_users, n_steps))
+    y_c, w_c = np.zeros((n_users, n_steps)), np.zeros((n_users, n_steps))
+    y_a, w_a = np.zeros((n_users, n_steps)), np.zeros((n_users, n_steps))
+    for k, problem in enumerate(problems):
+        u[k], reward[k] = problem.inputs.to_dense(t)
+        for obs, y, w in ((problem.c_obs, y_c, w_c), (problem.a_obs, y_a, w_a)):
+            for minute, value in obs:
+                idx = min(n_steps - 1, max(0, int(round(minute / dt))))
+                y[k, idx] += value
+                w[k, idx] += 1.0
+    y_c = np.divide(y_c, w_c, out=np.zeros_like(y_c), where=w_c > 0)
+    y_a = np.divide(y_a, w_a, out=np.zeros_like(y_a), where=w_a > 0)
+    sw_c, sw_a = np.sqrt(w_c), np.sqrt(w_a)
+
+    x0 = np.array([p.x0 for p in problems], dtype=float)
+    z_prior = np.log(np.array([astuple(p.warm_start) for p in problems], dtype=float))
+    z_prior = np.clip(z_prior, _LOG_LOWER, _LOG_UPPER)
+    offsets = np.vstack([np.zeros(n_params), config.fd_step * np.eye(n_params)])
+    n_lanes = offsets.shape[0]
+    engine = CravingODEEngine()
+
+    def evaluate(z: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        lanes = (z[:, None, :] + offsets[None]).reshape(-1, n_params)
+        _, c, a, _ = engine.simulate_batch(
+            np.repeat(x0[:, 0], n_lanes),
+            np.repeat(x0[:, 1], n_lanes),
+            np.repeat(x0[:, 2], n_lanes),
+            horizon_minutes=horizon,
+            dt_minutes=dt,
+            u_schedule=np.repeat(u, n_lanes, axis=0),
+            reward_pulses=np.repeat(reward, n_lanes, axis=0),
+            params={name: np.exp(lanes[:, i]) for i, name in enumerate(_PARAM_NAMES)},
+            method="exact",
+        )
+        c = c.reshape(n_users, n_lanes, n_steps)
+        a = a.reshape(n_users, n_lanes, n_steps)
+        res = np.concatenate(
+            [(c - y_c[:, None]) * sw_c[:, None], (a - y_a[:, None]) * sw_a[:, None]], axis=2
+        )
+        jac = (res[:, 1:] - res[:, :1]).transpose(0, 2, 1) / config.fd_step
+        return res[:, 0], jac
+
+    def cost_of(res: np.ndarray, z: np.ndarray) -> np.ndarray:
+        prior = config.prior_weight * ((z - z_prior) ** 2).sum(axis=1)
+        return 0.5 * ((res**2).sum(axis=1) + prior)
+
+    # Parameter sets whose trajectory is pinned at a clip bound (C saturating
+    # at 1 under the defaults) have a zero Jacobian, so LM alone cannot leave
+    # them. Each user starts from the best of the warm start and a few copies
+    # with a weaker craving drift.
+    alpha = _PARAM_NAMES.index("alpha_c")
+    z = res = jac = cost = None
+    for scale in _START_ALPHA_SCALES:
+        z_try = z_prior.copy()
+        z_try[:, alpha] += np.log(scale)
+        z_try = np.clip(z_try, _LOG_LOWER, _LOG_UPPER)
+        res_try, jac_try = evaluate(z_try)
+        cost_try = cost_of(res_try, z_try)
+        if z is None:
+            z, res, jac, cost = z_try, res_try, jac_try, cost_try
+            continue
+        better = cost_try < cost
+        z = np.where(better[:, None], z_try, z)
+        res = np.where(better[:, None], res_try, res)
+        jac = np.where(better[:, None, None], jac_try, jac)
+        cost = np.where(better, cost_try, cost)
+    mu = np.full(n_users, 1e-2)
+    eye = np.eye(n_params)
+    for _ in range(config.iterations):
+        jtj = np.einsum("nsp,nsq->npq", jac, jac) + config.prior_weight * eye
+        grad = np.einsum("nsp,ns->np", jac, res) + config.prior_weight * (z - z_prior)
+        damped = jtj + mu[:, None, None] * (np.diagonal(jtj, axis1=1, axis2=2)[:, :, None] * eye)
+        step = -np.linalg.solve(damped, grad[:, :, None])[:, :, 0]
+        z_new = np.clip(z + step, _LOG_LOWER, _LOG_UPPER)
+
+        res_new, jac_new = evaluate(z_new)
+        cost_new = cost_of(res_new, z_new)
+        accept = cost_new < cost
+        z = np.where(accept[:, None], z_new, z)
+        res = np.where(accept[:, None], res_new, res)
+        jac = np.where(accept[:, None, None], jac_new, jac)
+        cost = np.where(accept, cost_new, cost)
+        mu = np.where(accept, mu / 3.0, mu * 4.0)
+
+    n_obs = (w_c.sum(axis=1) + w_a.sum(axis=1)).astype(int)
+    rms = np.sqrt((res**2).sum(axis=1) / np.maximum(n_obs, 1))
+    theta = np.exp(z)
+    return [
+        CalibrationResult(
+            user_id=problem.user_id,
+            params=ODEParams(*theta[k].tolist()),
+            cost=float(rms[k]),
+            n_observations=int(n_obs[k]),
+        )
+        for k, problem in enumerate(problems)
+    ]
+
+
+class CalibrationEngine:
+    """
+    Builds calibration problems from the last window_days of logs, fits them
+    in chunks of users_per_batch users on a spawn process pool (inline when
+    workers is 0), stores the results in user_ode_params and drops stale
+    cached params and trajectories. Previous fits are used as warm starts.
+    """
+
+    def __init__(self, config: CalibrationConfig | None = None) -> None:
+        self.config = config or CalibrationConfig()
+        self._pool: Executor | None = None
+
+    async def due_users(self, session: AsyncSession, now: datetime) -> list[int]:
+        """
+        Users with enough craving logs in the window and at least one logged
+        since their last fit.
+        """
+        since = now - timedelta(days=self.config.window_days)
+        stmt = (
+            select(CravingLog.user_id)
+            .outerjoin(UserODEParams, UserODEParams.user_id == CravingLog.user_id)
+            .where(CravingLog.timestamp >= since)
+            .group_by(CravingLog.user_id, UserODEParams.fitted_at)
+            .having(
+                func.count(CravingLog.id) >= self.config.min_observations,
+                or_(
+                    UserODEParams.fitted_at.is_(None),
+                    func.max(CravingLog.timestamp) > UserODEParams.fitted_at,
+                ),
+            )
+            .order_by(CravingLog.user_id)
+        )
+        return list((await session.scalars(stmt)).all())
+
+    async def build_problems(
+        self,
+        session: AsyncSession,
+        user_ids: Sequence[int],
+        now: datetime,
+    ) -> list[CalibrationProblem]:
+        since = now - timedelta(days=self.config.window_days)
+        cravings = await session.execute(
+            select(CravingLog.user_id, CravingLog.timestamp, CravingLog.score, CravingLog.attention)
+            .where(
+                CravingLog.user_id.in_(user_ids),
+                CravingLog.timestamp >= since,
+                CravingLog.timestamp <= now,
+            )
+            .order_by(CravingLog.user_id, CravingLog.timestamp)
+        )
+        logs: dict[int, list] = {}
+        for row in cravings:
+            logs.setdefault(row.user_id, []).append(row)
+
+        tasks: dict[int, list] = {}
+        for task in await session.execute(
+            select(
+                TaskLog.user_id,
+                TaskLog.started_at,
+                TaskLog.completed_at,
+                TaskLog.difficulty,
+                TaskLog.reward_delta,
+            ).where(TaskLog.user_id.in_(user_ids), TaskLog.started_at >= since)
+        ):
+            tasks.setdefault(task.user_id, []).append(task)
+
+        warm = {
+            row.user_id: row_to_params(row)
+            for row in await session.scalars(
+                select(UserODEParams).where(UserODEParams.user_id.in_(user_ids))
+            )
+        }
+
+        problems = []
+        for user_id, rows in logs.items():
+            if len(rows) < self.config.min_observations:
+                continue
+            origin = rows[0].timestamp
+            horizon = (rows[-1].timestamp - origin).total_seconds() / 60.0
+            if horizon < self.config.dt_minutes:
+                continue
+            first_attention = next((r.attention for r in rows if r.attention is not None), None)
+            problems.append(
+                CalibrationProblem(
+                    user_id=user_id,
+                    x0=(
+                        rows[0].score / 10.0,
+                        first_attention / 10.0 if first_attention is not None else _DEFAULT_A0,
+                        0.0,
+                    ),
+                    horizon_minutes=horizon,
+                    c_obs=[((r.timestamp - origin).total_seconds() / 60.0, r.score / 10.0) for r in rows],
+                    a_obs=[
+                        ((r.timestamp - origin).total_seconds() / 60.0, r.attention / 10.0)
+                        for r in rows
+                        if r.attention is not None
+                    ],
+                    inputs=task_inputs(tasks.get(user_id, []), origin),
+                    warm_start=warm.get(user_id, ODEParams()),
+                )
+            )
+        return problems
+
+    async def calibrate(self, user_ids: Sequence[int], now: datetime | None = None) -> list[CalibrationResult]:
+        """
+        Calibrates users_per_batch users at a time: each chunk's logs are
+        loaded, fitted and stored before the next chunk is read, so memory
+        and bind parameters stay bounded by the chunk.
+        """
+        now = now or datetime.utcnow()
+        results: list[CalibrationResult] = []
+        for start in range(0, len(user_ids), self.config.users_per_batch):
+            chunk = user_ids[start : start + self.config.users_per_batch]
+            results.extend(await self._calibrate_chunk(chunk, now))
+        return results
+
+    async def run_due(self) -> int:
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as session:
+            user_ids = await self.due_users(session, now)
+        if not user_ids:
+            return 0
+        return len(await self.calibrate(user_ids, now))
+
+    def shutdown(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    async def _calibrate_chunk(self, user_ids: Sequence[int], now: datetime) -> list[CalibrationResult]:
+        async with AsyncSessionLocal() as session:
+            problems = await self.build_problems(session, user_ids, now)
+        if not problems:
+            return []
+        previous = {p.user_id: p.warm_start for p in problems}
+        results = await self._fit(problems)
+
+        async with AsyncSessionLocal() as session:
+            stmt = dialect_insert(session, UserODEParams)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["user_id"],
+                set_={
+                    name: getattr(stmt.excluded, name)
+                    for name in (*_PARAM_NAMES, "cost", "n_observations", "fitted_at")
+                },
+            )
+            await session.execute(
+                stmt,
+                [
+                    {
+                        "user_id": r.user_id,
+                        **{name: getattr(r.params, name) for name in _PARAM_NAMES},
+                        "cost": r.cost,
+                        "n_observations": r.n_observations,
+                        "fitted_at": now,
+                    }
+                    for r in results
+                ],
+            )
+            await session.commit()
+
+        params_cache = get_user_params_cache()
+        trajectories = get_trajectory_cache()
+        default = ODEParams()
+        for result in results:
+            params_cache.invalidate(result.user_id)
+            old = previous[result.user_id]
+            if old != default:
+                trajectories.invalidate_fingerprint(params_fingerprint(old))
+                trajectories.invalidate_fingerprint(params_fingerprint(old, RLSchedulerConfig()))
+        return results
+
+    async def _fit(self, batch: list[CalibrationProblem]) -> list[CalibrationResult]:
+        if self.config.workers <= 0:
+            return await asyncio.to_thread(fit_problems, batch, self.config)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.config.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, fit_problems, batch, self.config)
+
+
+class CalibrationScheduler:
+    """
+    Runs CalibrationEngine.run_due() every interval_seconds on the event
+    loop; the fitting itself happens on the engine's worker pool.
+    """
+
+    def __init__(self, engine: CalibrationEngine, interval_seconds: float) -> None:
+        self.engine = engine
+        self.interval_seconds = interval_seconds
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.engine.shutdown()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                fitted = await self.engine.run_due()
+                if fitted:
+                    logger.info("Calibrated ODE parameters for %d users", fitted)
+            except Exception:
+                logger.exception("ODE calibration run failed")
+            await asyncio.sleep(self.interval_seconds)
+
+
+@lru_cache
+def get_calibration_scheduler() -> CalibrationScheduler:
+    settings = get_settings()
+    config = CalibrationConfig(
+        window_days=settings.calibration_window_days,
+        dt_minutes=settings.calibration_dt_minutes,
+        iterations=settings.calibration_iterations,
+        prior_weight=settings.calibration_prior_weight,
+        min_observations=settings.calibration_min_observations,
+        users_per_batch=settings.calibration_users_per_batch,
+        workers=settings.calibration_workers,
+    )
+    return CalibrationScheduler(CalibrationEngine(config), settings.calibration_interval_seconds)
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+from dataclasses import dataclass, fields
+from datetime import date
+from functools import lru_cache
+from typing import Any, Iterable, Mapping
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import AsyncSessionLocal, dialect_insert
+from ..models import CravingLog, DailySession, DailyState, TaskLog, User
+from .markov_model import DailyMarkovModel, MarkovParams
+
+_SUM_FIELDS = (
+    "craving_sum",
+    "craving_count",
+    "attention_sum",
+    "attention_count",
+    "reward_sum",
+    "task_count",
+)
+
+
+@dataclass
+class DailyDelta:
+    """
+    Contribution of one or more logs to a user's day. Craving score and
+    attention (0-10) are scaled to C and A in [0, 1]; a task contributes its
+    reward_delta to R.
+    """
+
+    user_id: int
+    day: date
+    craving_sum: float = 0.0
+    craving_count: int = 0
+    attention_sum: float = 0.0
+    attention_count: int = 0
+    reward_sum: float = 0.0
+    task_count: int = 0
+
+    @classmethod
+    def from_row(cls, model: type, row: Mapping[str, Any]) -> DailyDelta | None:
+        if model is CravingLog:
+            attention = row.get("attention")
+            return cls(
+                user_id=row["user_id"],
+                day=row["timestamp"].date(),
+                craving_sum=row["score"] / 10.0,
+                craving_count=1,
+                attention_sum=(attention or 0) / 10.0,
+                attention_count=int(attention is not None),
+            )
+        if model is TaskLog:
+            return cls(
+                user_id=row["user_id"],
+                day=row["started_at"].date(),
+                reward_sum=row["reward_delta"],
+                task_count=1,
+            )
+        return None
+
+    @classmethod
+    def from_log(cls, log: Any) -> DailyDelta | None:
+        model = type(log)
+        return cls.from_row(model, {c.key: getattr(log, c.key) for c in model.__mapper__.column_attrs})
+
+    def add(self, other: DailyDelta) -> None:
+        for name in _SUM_FIELDS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+
+def _averages(row: Any) -> tuple[float, float, float]:
+    avg_c = row.craving_sum / row.craving_count if row.craving_count else 0.0
+    avg_a = row.attention_sum / row.attention_count if row.attention_count else 0.0
+    avg_r = row.reward_sum / row.task_count if row.task_count else 0.0
+    return avg_c, avg_a, avg_r
+
+
+class DailyAggregator:
+    """
+    Maintains DailySession rows incrementally from craving and task logs.
+
+    Each batch of deltas is merged per user-day and applied with one atomic
+    upsert that adds to the row's running sums, so averages are recomputed
+    from the sums in O(1). The day is classified from its own averages
+    against the MarkovParams thresholds (see classify); the transition model
+    is only used for prediction. abstinent_streak carries forward from the
+    previous session: reset on a smoking day, otherwise advanced by the days
+    elapsed. Logs that land before a user's latest session re-derive the
+    later sessions' state and streak, stopping as soon as one is unchanged.
+    """
+
+    def __init__(self, markov_params: MarkovParams | None = None) -> None:
+        self.markov = DailyMarkovModel(markov_params)
+
+    def classify(
+        self,
+        prev: DailySession | None,
+        day: date,
+        avg_c: float,
+        avg_a: float,
+        avg_r: float,
+    ) -> tuple[DailyState, bool, int]:
+        """
+        A day counts as smoking when its craving exceeds theta_c_relapse by
+        more than attention exceeds theta_a_protect, the same pressure that
+        drives S1 -> S0 in the transition model. Otherwise the user is
+        abstinent: S1 after a smoking day or on their first day, promoted
+        from S1 to S2 when reward plus attention clears theta_a_protect, and
+        kept in S2 while craving stays at or below attention (back to S1
+        otherwise).
+        """
+        p = self.markov.params
+        prev_state = prev.state if prev is not None else None
+        if avg_c - p.theta_c_relapse - (avg_a - p.theta_a_protect) > 0:
+            state = DailyState.S0_SMOKING
+        elif prev_state == DailyState.S2_STABLE:
+            state = DailyState.S2_STABLE if avg_c <= avg_a else DailyState.S1_WITHDRAWAL
+        elif prev_state == DailyState.S1_WITHDRAWAL and avg_r + avg_a > p.theta_a_protect:
+            state = DailyState.S2_STABLE
+        else:
+            state = DailyState.S1_WITHDRAWAL
+        smoked = state == DailyState.S0_SMOKING
+        if smoked:
+            streak = 0
+        elif prev is None:
+            streak = 1
+        else:
+            streak = prev.abstinent_streak + (day - prev.date).days
+        return state, smoked, streak
+
+    async def apply(self, session: AsyncSession, deltas: Iterable[DailyDelta | None]) -> None:
+        """
+        Folds deltas into the session's transaction; the caller commits.
+        """
+        merged: dict[tuple[int, date], DailyDelta] = {}
+        for delta in deltas:
+            if delta is None:
+                continue
+            key = (delta.user_id, delta.day)
+            if key in merged:
+                merged[key].add(delta)
+            else:
+                merged[key] = DailyDelta(**{f.name: getattr(delta, f.name) for f in fields(delta)})
+
+        for user_id, day in sorted(merged):
+            row = await self._upsert(session, merged[(user_id, day)])
+            prev = await session.scalar(
+                select(DailySession)
+                .where(DailySession.user_id == user_id, DailySession.date < day)
+                .order_by(DailySession.date.desc())
+                .limit(1)
+            )
+            self._derive(row, prev)
+            await self._carry_forward(session, row)
+            await session.flush()
+
+    def _derive(self, row: DailySession, prev: DailySession | None) -> bool:
+        avg_c, avg_a, avg_r = _averages(row)
+        state, smoked, streak = self.classify(prev, row.date, avg_c, avg_a, avg_r)
+        changed = (row.state, row.smoked_today, row.abstinent_streak) != (state, smoked, streak)
+        row.avg_craving, row.avg_attention, row.avg_reward = avg_c, avg_a, avg_r
+        row.state, row.smoked_today, row.abstinent_streak = state, smoked, streak
+        return changed
+
+    async def _upsert(self, session: AsyncSession, delta: DailyDelta) -> DailySession:
+        sums = {name: getattr(delta, name) for name in _SUM_FIELDS}
+        stmt = dialect_insert(session, DailySession).values(
+            user_id=delta.user_id,
+            date=delta.day,
+            state=DailyState.S1_WITHDRAWAL,
+            avg_craving=0.0,
+            avg_attention=0.0,
+            avg_reward=0.0,
+            smoked_today=False,
+            abstinent_streak=0,
+            **sums,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "date"],
+            set_={name: getattr(DailySession, name) + getattr(stmt.excluded, name) for name in sums},
+        ).returning(DailySession)
+        result = await session.scalars(stmt, execution_options={"populate_existing": True})
+        return result.one()
+
+    async def _carry_forward(self, session: AsyncSession, row: DailySession) -> None:
+        later = await session.scalars(
+            select(DailySession)
+            .where(DailySession.user_id == row.user_id, DailySession.date > row.date)
+            .order_by(DailySession.date)
+        )
+        prev = row
+        for nxt in later:
+            if not self._derive(nxt, prev):
+                break
+            prev = nxt
+
+    async def backfill(self, users_per_chunk: int = 500) -> int:
+        """
+        Rebuilds every user's DailySession rows from the raw logs, one
+        transaction per chunk of users. Returns the number of rows written.
+        """
+        written = 0
+        last_id = 0
+        while True:
+            async with AsyncSessionLocal() as session:
+                user_ids = (
+                    await session.scalars(
+                        select(User.id).where(User.id > last_id).order_by(User.id).limit(users_per_chunk)
+                    )
+                ).all()
+                if not user_ids:
+                    return written
+                last_id = user_ids[-1]
+
+                await session.execute(delete(DailySession).where(DailySession.user_id.in_(user_ids)))
+                rows = self._chain(await self._grouped_deltas(session, user_ids))
+                session.add_all(rows)
+                await session.commit()
+                written += len(rows)
+
+    async def _grouped_deltas(self, session: AsyncSession, user_ids: list[int]) -> list[DailyDelta]:
+        merged: dict[tuple[int, date], DailyDelta] = {}
+
+        def bucket(user_id: int, day: Any) -> DailyDelta:
+            day = date.fromisoformat(day) if isinstance(day, str) else day
+            return merged.setdefault((user_id, day), DailyDelta(user_id=user_id, day=day))
+
+        craving_day = func.date(CravingLog.timestamp)
+        cravings = await session.execute(
+            select(
+                CravingLog.user_id,
+                craving_day,
+                func.sum(CravingLog.score),
+                func.count(CravingLog.id),
+                func.coalesce(func.sum(CravingLog.attention), 0),
+                func.count(CravingLog.attention),
+            )
+            .where(CravingLog.user_id.in_(user_ids))
+            .group_by(CravingLog.user_id, craving_day)
+        )
+        for user_id, day, score_sum, count, attention_sum, attention_count in cravings:
+            delta = bucket(user_id, day)
+            delta.craving_sum, delta.craving_count = score_sum / 10.0, count
+            delta.attention_sum, delta.attention_count = attention_sum / 10.0, attention_count
+
+        task_day = func.date(TaskLog.started_at)
+        tasks = await session.execute(
+            select(TaskLog.user_id, task_day, func.sum(TaskLog.reward_delta), func.count(TaskLog.id))
+            .where(TaskLog.user_id.in_(user_ids))
+            .group_by(TaskLog.user_id, task_day)
+        )
+        for user_id, day, reward_sum, count in tasks:
+            delta = bucket(user_id, day)
+            delta.reward_sum, delta.task_count = reward_sum, count
+
+        return [merged[key] for key in sorted(merged)]
+
+    def _chain(self, deltas: list[DailyDelta]) -> list[DailySession]:
+        rows: list[DailySession] = []
+        prev: DailySession | None = None
+        for delta in deltas:
+            if prev is not None and prev.user_id != delta.user_id:
+                prev = None
+            row = DailySession(
+                user_id=delta.user_id,
+                date=delta.day,
+                **{name: getattr(delta, name) for name in _SUM_FIELDS},
+            )
+            self._derive(row, prev)
+            rows.append(row)
+            prev = row
+        return rows
+
+
+@lru_cache
+def get_daily_aggregator() -> DailyAggregator:
+    return DailyAggregator()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild DailySession rows from raw logs.")
+    parser.add_argument("--users-per-chunk", type=int, default=500)
+    args = parser.parse_args()
+    written = asyncio.run(get_daily_aggregator().backfill(args.users_per_chunk))
+    print(f"wrote {written} daily sessions")
+
+
+if __name__ == "__main__":
+    main()
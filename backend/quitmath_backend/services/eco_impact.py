@@ -1,4 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import astuple, dataclass, fields
+from typing import Sequence
+
+import numpy as np
 
 
 @dataclass
@@ -10,6 +13,15 @@ class EcoCoefficients:
     karma_per_kg_co2e: float = 1.0
 
 
+def stack_coefficients(coeffs: Sequence[EcoCoefficients]) -> dict[str, np.ndarray]:
+    """
+    Column-stacks coefficient sets into one (S,) array per field, for
+    evaluating S scenarios at once.
+    """
+    values = np.array([astuple(c) for c in coeffs], dtype=float).reshape(len(coeffs), -1)
+    return {f.name: values[:, i] for i, f in enumerate(fields(EcoCoefficients))}
+
+
 class EcoImpactService:
     """
     Computes eco-impact metrics for avoided disposable vapes.
@@ -36,3 +48,31 @@ class EcoImpactService:
             "co2e_kg": co2e_kg,
             "karma": total_karma,
         }
+
+    def disposables_to_eco_array(
+        self,
+        avoided_units: np.ndarray,
+        coeffs: Sequence[EcoCoefficients] | None = None,
+    ) -> dict[str, np.ndarray]:
+        """
+        Array form of disposables_to_eco for whole cohorts: avoided_units may
+        have any shape (e.g. users x dates). With coeffs, every scenario is
+        evaluated in the same pass and each result gains a leading (S,) axis.
+        """
+        units = np.asarray(avoided_units, dtype=float)
+        if coeffs is None:
+            c = {name: v[0] for name, v in stack_coefficients([self.coeffs]).items()}
+        else:
+            expand = (slice(None),) + (None,) * units.ndim
+            c = {name: v[expand] for name, v in stack_coefficients(coeffs).items()}
+
+        plastic_g = units * c["plastic_per_disposable_g"]
+        battery_g = units * c["battery_per_disposable_g"]
+        co2e_kg = units * c["co2e_per_disposable_kg"]
+        karma = (plastic_g + battery_g) * c["karma_per_gram"] + co2e_kg * c["karma_per_kg_co2e"]
+        return {
+            "plastic_g": plastic_g,
+            "battery_g": battery_g,
+            "co2e_kg": co2e_kg,
+            "karma": karma,
+        }
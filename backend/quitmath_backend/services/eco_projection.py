@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Sequence
+
+import numpy as np
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..models import DailySession, EcoShardRow, User
+from .eco_impact import EcoCoefficients, EcoImpactService
+
+
+@dataclass
+class ScenarioProjection:
+    coefficients: EcoCoefficients
+    plastic_g: float
+    battery_g: float
+    co2e_kg: float
+    karma: float
+
+
+@dataclass
+class CohortProjection:
+    region: str | None
+    until: date
+    users: int
+    disposables_per_day: float
+    karma_per_unit: float
+    avoided_units_to_date: float
+    avoided_units_projected: float
+    shard_karma: float
+    scenarios: list[ScenarioProjection]
+
+
+class EcoProjector:
+    """
+    Projects avoided disposables and their eco impact for a cohort.
+
+    Each user's abstinence rate is the share of their DailySessions without
+    smoking. Projected avoided units are disposables_per_day x (abstinent days
+    so far + rate x days remaining until the target date). The per-day
+    baseline and karma per unit come from the latest shard row for the
+    configured parameter (a per-user-per-year figure), falling back to
+    settings and the service's coefficients when none was imported. All
+    users and coefficient scenarios are evaluated as one (S, N) array pass.
+    """
+
+    def __init__(self, service: EcoImpactService | None = None) -> None:
+        self.service = service or EcoImpactService()
+        self.settings = get_settings()
+
+    async def shard_rates(self, session: AsyncSession, region: str | None) -> tuple[float, float]:
+        stmt = select(EcoShardRow).where(
+            EcoShardRow.parameter == self.settings.eco_projection_parameter
+        )
+        if region is not None:
+            stmt = stmt.where(EcoShardRow.region == region)
+        row = await session.scalar(stmt.order_by(EcoShardRow.period.desc()).limit(1))
+        if row is None:
+            per_unit = self.service.disposables_to_eco(1.0)["karma"]
+            return self.settings.eco_default_disposables_per_day, per_unit
+        return (row.baselinevalue - row.improvedvalue) / 365.0, row.karmaperunit
+
+    async def cohort_abstinence(
+        self, session: AsyncSession, region: str | None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Per-user (abstinent days, recorded days) over the cohort's sessions.
+        """
+        stmt = select(
+            func.sum(case((DailySession.smoked_today.is_(False), 1), else_=0)),
+            func.count(DailySession.id),
+        ).group_by(DailySession.user_id)
+        if region is not None:
+            stmt = stmt.join(User, User.id == DailySession.user_id).where(User.region == region)
+        rows = (await session.execute(stmt)).all()
+        counts = np.array(rows, dtype=float).reshape(-1, 2)
+        return counts[:, 0], counts[:, 1]
+
+    async def project(
+        self,
+        session: AsyncSession,
+        until: date,
+        region: str | None = None,
+        scenarios: Sequence[EcoCoefficients] = (),
+        today: date | None = None,
+    ) -> CohortProjection:
+        # DailySession days are UTC dates, as are the logs they come from.
+        today = today or datetime.utcnow().date()
+        per_day, karma_per_unit = await self.shard_rates(session, region)
+        abstinent, recorded = await self.cohort_abstinence(session, region)
+
+        remaining = max(0, (until - today).days)
+        rate = np.divide(abstinent, recorded, out=np.zeros_like(abstinent), where=recorded > 0)
+        to_date = per_day * abstinent
+        projected = per_day * (abstinent + rate * remaining)
+
+        coeffs = list(scenarios) or [self.service.coeffs]
+        impact = self.service.disposables_to_eco_array(projected, coeffs)
+        totals = {name: values.sum(axis=1) for name, values in impact.items()}
+        return CohortProjection(
+            region=region,
+            until=until,
+            users=int(projected.shape[0]),
+            disposables_per_day=per_day,
+            karma_per_unit=karma_per_unit,
+            avoided_units_to_date=float(to_date.sum()),
+            avoided_units_projected=float(projected.sum()),
+            shard_karma=float(projected.sum() * karma_per_unit),
+            scenarios=[
+                ScenarioProjection(
+                    coefficients=c,
+                    plastic_g=float(totals["plastic_g"][i]),
+                    battery_g=float(totals["battery_g"][i]),
+                    co2e_kg=float(totals["co2e_kg"][i]),
+                    karma=float(totals["karma"][i]),
+                )
+                for i, c in enumerate(coeffs)
+            ],
+        )
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import math
+from dataclasses import dataclass
+from typing import Iterable
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import AsyncSessionLocal, dialect_insert
+from ..models import EcoImpact, EcoTotal, User
+
+logger = logging.getLogger(__name__)
+
+# (user_id, metric, value, karma) of one EcoImpact row
+EcoEntry = tuple[int, str, float, float]
+
+
+@dataclass
+class TotalsMismatch:
+    user_id: int
+    metric: str
+    ledger_value: float
+    ledger_karma: float
+    total_value: float
+    total_karma: float
+
+
+async def add_to_totals(session: AsyncSession, entries: Iterable[EcoEntry]) -> None:
+    """
+    Adds ledger entries to the eco_totals rollup inside the caller's
+    transaction, with one atomic upsert per (user, metric).
+    """
+    merged: dict[tuple[int, str], list[float]] = {}
+    for user_id, metric, value, karma in entries:
+        acc = merged.setdefault((user_id, metric), [0.0, 0.0, 0])
+        acc[0] += value
+        acc[1] += karma
+        acc[2] += 1
+    if not merged:
+        return
+
+    stmt = dialect_insert(session, EcoTotal).values(
+        [
+            {"user_id": u, "metric": m, "total_value": v, "total_karma": k, "entries": n}
+            for (u, m), (v, k, n) in sorted(merged.items())
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "metric"],
+        set_={
+            "total_value": EcoTotal.total_value + stmt.excluded.total_value,
+            "total_karma": EcoTotal.total_karma + stmt.excluded.total_karma,
+            "entries": EcoTotal.entries + stmt.excluded.entries,
+        },
+    )
+    await session.execute(stmt)
+
+
+async def _ledger_totals(
+    session: AsyncSession, user_ids: list[int]
+) -> dict[tuple[int, str], tuple[float, float, int]]:
+    result = await session.execute(
+        select(
+            EcoImpact.user_id,
+            EcoImpact.metric,
+            func.sum(EcoImpact.value),
+            func.sum(EcoImpact.karma),
+            func.count(EcoImpact.id),
+        )
+        .where(EcoImpact.user_id.in_(user_ids))
+        .group_by(EcoImpact.user_id, EcoImpact.metric)
+    )
+    return {(u, m): (float(v or 0.0), float(k or 0.0), n) for u, m, v, k, n in result}
+
+
+async def reconcile_totals(users_per_chunk: int = 500, repair: bool = False) -> list[TotalsMismatch]:
+    """
+    Compares eco_totals with a GROUP BY over the ledger, one chunk of users
+    at a time, and returns every (user, metric) that disagrees. With repair,
+    the rollup rows of affected users are rebuilt from the ledger in the same
+    transaction as the check.
+    """
+    mismatches: list[TotalsMismatch] = []
+    last_id = 0
+    while True:
+        async with AsyncSessionLocal() as session:
+            user_ids = (
+                await session.scalars(
+                    select(User.id).where(User.id > last_id).order_by(User.id).limit(users_per_chunk)
+                )
+            ).all()
+            if not user_ids:
+                return mismatches
+            last_id = user_ids[-1]
+
+            ledger = await _ledger_totals(session, user_ids)
+            rollup = {
+                (t.user_id, t.metric): t
+                for t in await session.scalars(select(EcoTotal).where(EcoTotal.user_id.in_(user_ids)))
+            }
+            found: list[TotalsMismatch] = []
+            for key in sorted(ledger.keys() | rollup.keys()):
+                value, karma, _ = ledger.get(key, (0.0, 0.0, 0))
+                total = rollup.get(key)
+                total_value = total.total_value if total is not None else 0.0
+                total_karma = total.total_karma if total is not None else 0.0
+                if not (
+                    math.isclose(value, total_value, rel_tol=1e-9, abs_tol=1e-9)
+                    and math.isclose(karma, total_karma, rel_tol=1e-9, abs_tol=1e-9)
+                    and (total is not None) == (key in ledger)
+                ):
+                    found.append(TotalsMismatch(key[0], key[1], value, karma, total_value, total_karma))
+
+            if repair and found:
+                stale = sorted({m.user_id for m in found})
+                await session.execute(delete(EcoTotal).where(EcoTotal.user_id.in_(stale)))
+                session.add_all(
+                    EcoTotal(user_id=u, metric=m, total_value=v, total_karma=k, entries=n)
+                    for (u, m), (v, k, n) in sorted(ledger.items())
+                    if u in stale
+                )
+                await session.commit()
+            mismatches.extend(found)
+
+
+async def backfill_if_empty(users_per_chunk: int = 500) -> int:
+    """
+    Builds eco_totals from the ledger when the rollup is still empty but
+    ledger rows exist, as on the first start after eco_totals was added.
+    Returns the number of (user, metric) totals written. Nothing guards
+    against concurrent callers, so only single-process deployments should
+    run it at startup.
+    """
+    async with AsyncSessionLocal() as session:
+        has_ledger = await session.scalar(select(EcoImpact.id).limit(1))
+        has_totals = await session.scalar(select(EcoTotal.user_id).limit(1))
+    if has_ledger is None or has_totals is not None:
+        return 0
+    logger.info("eco_totals is empty; building it from the eco_impacts ledger.")
+    written = len(await reconcile_totals(users_per_chunk, repair=True))
+    logger.info("Built %d eco totals from the ledger.", written)
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check eco_totals against the eco_impacts ledger.")
+    parser.add_argument("--repair", action="store_true", help="Rebuild rollups that disagree.")
+    parser.add_argument("--users-per-chunk", type=int, default=500)
+    args = parser.parse_args()
+    mismatches = asyncio.run(reconcile_totals(args.users_per_chunk, repair=args.repair))
+    for m in mismatches:
+        print(
+            f"user {m.user_id} {m.metric}: ledger {m.ledger_value:g}/{m.ledger_karma:g} "
+            f"rollup {m.total_value:g}/{m.total_karma:g}"
+        )
+    print(f"{len(mismatches)} mismatched totals{' repaired' if args.repair else ''}")
+
+
+if __name__ == "__main__":
+    main()
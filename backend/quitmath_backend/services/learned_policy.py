@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+
+def policy_features(c: np.ndarray, a: np.ndarray, r: np.ndarray) -> np.ndarray:
+    """
+    Quadratic state features shared by training and inference, shape (N, 10).
+    """
+    c, a, r = (np.asarray(v, dtype=float).reshape(-1) for v in (c, a, r))
+    return np.stack(
+        [np.ones_like(c), c, a, r, c * c, a * a, r * r, c * a, c * r, a * r],
+        axis=1,
+    )
+
+
+def enforce_schedule_limits(
+    chosen: np.ndarray,
+    min_gap_slots: int,
+    max_tasks: int,
+) -> np.ndarray:
+    """
+    Drops chosen slots, earliest first, that come within min_gap_slots of the
+    previous kept slot or exceed max_tasks; mirrors the heuristic's limits.
+    """
+    chosen = np.asarray(chosen, dtype=bool)
+    kept = np.zeros_like(chosen)
+    last = np.full(chosen.shape[0], -(10**6), dtype=np.intp)
+    count = np.zeros(chosen.shape[0], dtype=np.intp)
+    for slot in range(chosen.shape[1]):
+        take = chosen[:, slot] & (slot - last >= min_gap_slots) & (count < max_tasks)
+        kept[:, slot] = take
+        last = np.where(take, slot, last)
+        count += take
+    return kept
+
+
+@dataclass
+class LearnedPolicy:
+    """
+    Open-loop task scheduling policy trained by policy gradient.
+
+    theta maps the initial-state features to one logit per decision slot of
+    slot_minutes; a task is proposed in every slot whose logit is positive,
+    subject to the gap and count limits. A suggestion is therefore one
+    (1, F) x (F, K) product with no simulation.
+    """
+
+    theta: np.ndarray
+    slot_minutes: float
+    min_gap_slots: int
+    max_tasks: int
+
+    @property
+    def horizon_minutes(self) -> float:
+        return self.theta.shape[1] * self.slot_minutes
+
+    def logits(self, c: np.ndarray, a: np.ndarray, r: np.ndarray) -> np.ndarray:
+        return policy_features(c, a, r) @ self.theta
+
+    def suggest(self, c0: float, a0: float, r0: float) -> list[int]:
+        return self.suggest_batch(np.array([c0]), np.array([a0]), np.array([r0]))[0]
+
+    def suggest_batch(self, c0: np.ndarray, a0: np.ndarray, r0: np.ndarray) -> list[list[int]]:
+        chosen = enforce_schedule_limits(
+            self.logits(c0, a0, r0) > 0.0, self.min_gap_slots, self.max_tasks
+        )
+        return [
+            [int(slot * self.slot_minutes) for slot in np.flatnonzero(row)] for row in chosen
+        ]
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as fh:
+            np.savez(
+                fh,
+                theta=self.theta,
+                slot_minutes=self.slot_minutes,
+                min_gap_slots=self.min_gap_slots,
+                max_tasks=self.max_tasks,
+            )
+
+    @classmethod
+    def load(cls, path: str | Path) -> "LearnedPolicy":
+        with np.load(path) as data:
+            return cls(
+                theta=np.array(data["theta"], dtype=float),
+                slot_minutes=float(data["slot_minutes"]),
+                min_gap_slots=int(data["min_gap_slots"]),
+                max_tasks=int(data["max_tasks"]),
+            )
+
+
+@lru_cache(maxsize=8)
+def load_learned_policy(path: str) -> LearnedPolicy:
+    return LearnedPolicy.load(path)
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Iterable
+
+import numpy as np
+
+from ..config import get_settings
+
+
+class LiveLimitExceeded(Exception):
+    pass
+
+
+class LiveHub:
+    """
+    In-process registry of live connections per user.
+
+    publish() only sets each of the user's connection events, so any number
+    of log writes between two sends collapse into one recompute: a slow
+    client receives fewer, fresher updates instead of a growing backlog.
+    Writes served by another process are picked up by each connection's
+    periodic refresh.
+    """
+
+    def __init__(self, max_connections_per_user: int = 3) -> None:
+        self.max_connections_per_user = max_connections_per_user
+        self.published = 0
+        self._events: dict[int, set[asyncio.Event]] = defaultdict(set)
+
+    def check(self, user_id: int) -> None:
+        if len(self._events.get(user_id, ())) >= self.max_connections_per_user:
+            raise LiveLimitExceeded(
+                f"At most {self.max_connections_per_user} live connections per user."
+            )
+
+    def subscribe(self, user_id: int) -> asyncio.Event:
+        self.check(user_id)
+        event = asyncio.Event()
+        event.set()  # the first pass sends a full snapshot
+        self._events[user_id].add(event)
+        return event
+
+    def unsubscribe(self, user_id: int, event: asyncio.Event) -> None:
+        events = self._events.get(user_id)
+        if events is not None:
+            events.discard(event)
+            if not events:
+                del self._events[user_id]
+
+    def publish(self, user_ids: Iterable[int]) -> None:
+        for user_id in set(user_ids):
+            for event in self._events.get(user_id, ()):
+                event.set()
+                self.published += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "users": len(self._events),
+            "connections": sum(len(events) for events in self._events.values()),
+            "published": self.published,
+        }
+
+
+@lru_cache
+def get_live_hub() -> LiveHub:
+    return LiveHub(max_connections_per_user=get_settings().live_max_connections_per_user)
+
+
+class LiveTrajectory:
+    """
+    Per-connection record of what the client already holds.
+
+    Trajectories are placed on an absolute grid of dt_minutes steps from the
+    connection's origin, so successive predictions overlap point for point.
+    diff() returns only points that are new or differ by more than epsilon
+    from the copy the client holds; the client drops indices below the
+    window start.
+    """
+
+    def __init__(self, origin: datetime, dt_minutes: float, epsilon: float = 1e-3) -> None:
+        self.origin = origin
+        self.dt_minutes = dt_minutes
+        self.epsilon = epsilon
+        self.start = 0
+        self.values = np.empty((0, 3))
+        self.offsets: list[int] | None = None
+
+    def next_index(self, now: datetime) -> int:
+        return math.ceil((now - self.origin).total_seconds() / 60.0 / self.dt_minutes)
+
+    def time_at(self, index: int) -> datetime:
+        return self.origin + timedelta(minutes=index * self.dt_minutes)
+
+    def diff(self, start: int, values: np.ndarray) -> list[list[float]]:
+        old_end = self.start + self.values.shape[0]
+        changed = np.ones(values.shape[0], dtype=bool)
+        held = np.round(values, 4)
+        lo, hi = max(start, self.start), min(start + values.shape[0], old_end)
+        if hi > lo:
+            window = slice(lo - start, hi - start)
+            previous = self.values[lo - self.start : hi - self.start]
+            changed[window] = (np.abs(values[window] - previous) > self.epsilon).any(axis=1)
+            # Unsent points keep the client's copy as their baseline, so drift
+            # below epsilon accumulates until it is sent.
+            kept = ~changed[window]
+            held[window][kept] = previous[kept]
+        self.start, self.values = start, held
+        idx = np.flatnonzero(changed)
+        return [[int(start + i), *held[i].tolist()] for i in idx]
+
+
+def sse_event(event: str, data: dict[str, Any]) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode("utf-8")
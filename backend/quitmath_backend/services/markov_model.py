@@ -1,9 +1,18 @@
 from dataclasses import dataclass
+from typing import Iterable
 
 import numpy as np
 
 from ..models import DailyState
 
+# Row/column order of every transition matrix and distribution vector.
+STATES: tuple[DailyState, ...] = (
+    DailyState.S0_SMOKING,
+    DailyState.S1_WITHDRAWAL,
+    DailyState.S2_STABLE,
+)
+STATE_INDEX: dict[DailyState, int] = {state: i for i, state in enumerate(STATES)}
+
 
 @dataclass
 class MarkovParams:
@@ -19,6 +28,10 @@ class DailyMarkovModel:
     S0: Smoking
     S1: Abstinent, high withdrawal
     S2: Stable abstinent
+
+    transition_probabilities() handles one user-day; the array methods below
+    evaluate the same rules for whole cohorts and horizons at once, with
+    states ordered as in STATES.
     """
 
     def __init__(self, params: MarkovParams | None = None) -> None:
@@ -65,3 +78,148 @@ class DailyMarkovModel:
             }
 
         raise ValueError(f"Unknown state: {state}")
+
+    def transition_matrices(
+        self,
+        avg_c: np.ndarray | float,
+        avg_a: np.ndarray | float,
+        avg_r: np.ndarray | float,
+    ) -> np.ndarray:
+        """
+        Returns transition tensors of shape (..., 3, 3), one per element of the
+        broadcast averages, with P[..., i, j] = P(S_j tomorrow | S_i today).
+
+        Entries match transition_probabilities(); the S1 row is renormalised
+        where its clipped probabilities would otherwise sum above one.
+        """
+        p = self.params
+        c, a, r = np.broadcast_arrays(
+            np.asarray(avg_c, dtype=float),
+            np.asarray(avg_a, dtype=float),
+            np.asarray(avg_r, dtype=float),
+        )
+        out = np.zeros(c.shape + (3, 3), dtype=float)
+        s0, s1, s2 = (STATE_INDEX[s] for s in STATES)
+
+        p_quit = np.clip(0.1 + 0.4 * r, 0.0, 1.0)
+        out[..., s0, s0] = 1.0 - p_quit
+        out[..., s0, s1] = p_quit
+
+        x_relapse = c - p.theta_c_relapse - (a - p.theta_a_protect)
+        p_s1_s0 = np.clip(1.0 / (1.0 + np.exp(-p.k_relapse * x_relapse)), 0.0, 1.0)
+        x_recover = r + a - p.theta_a_protect
+        p_s1_s2 = np.clip(1.0 / (1.0 + np.exp(-p.k_recovery * x_recover)), 0.0, 1.0)
+        stay = np.clip(1.0 - p_s1_s0 - p_s1_s2, 0.0, 1.0)
+        total = np.maximum(p_s1_s0 + stay + p_s1_s2, 1.0)
+        out[..., s1, s0] = p_s1_s0 / total
+        out[..., s1, s1] = stay / total
+        out[..., s1, s2] = p_s1_s2 / total
+
+        relapse = np.clip(0.05 + 0.4 * (c - a), 0.0, 1.0)
+        out[..., s2, s0] = relapse * 0.2
+        out[..., s2, s1] = relapse * 0.8
+        out[..., s2, s2] = 1.0 - relapse
+        return out
+
+    @staticmethod
+    def state_distribution(states: Iterable[DailyState]) -> np.ndarray:
+        """
+        One-hot (N, 3) distributions for a sequence of known current states.
+        """
+        idx = np.array([STATE_INDEX[DailyState(s)] for s in states], dtype=np.intp)
+        return np.eye(len(STATES), dtype=float)[idx]
+
+    @staticmethod
+    def propagate(
+        p0: np.ndarray,
+        transitions: np.ndarray,
+        days: int | None = None,
+    ) -> np.ndarray:
+        """
+        Forward state distributions, returned with shape (N, days + 1, 3).
+
+        transitions is either (N, 3, 3), applied for `days` days, or (N, k, 3, 3)
+        with one matrix per day, in which case days defaults to k.
+        """
+        p0 = np.asarray(p0, dtype=float)
+        transitions = np.asarray(transitions, dtype=float)
+        stationary = transitions.ndim == 3
+        if stationary:
+            if days is None:
+                raise ValueError("days is required for stationary transitions.")
+        else:
+            days = transitions.shape[1] if days is None else days
+            if days > transitions.shape[1]:
+                raise ValueError("days exceeds the number of per-day transitions.")
+
+        out = np.empty((p0.shape[0], days + 1, 3), dtype=float)
+        out[:, 0] = p0
+        for d in range(days):
+            step = transitions if stationary else transitions[:, d]
+            out[:, d + 1] = np.einsum("ni,nij->nj", out[:, d], step)
+        return out
+
+    @staticmethod
+    def distribution_after(p0: np.ndarray, transitions: np.ndarray, days: int) -> np.ndarray:
+        """
+        (N, 3) distribution after `days` stationary steps via matrix powers,
+        i.e. O(log days) batched products.
+        """
+        power = np.linalg.matrix_power(np.asarray(transitions, dtype=float), days)
+        return np.einsum("ni,nij->nj", np.asarray(p0, dtype=float), power)
+
+    @staticmethod
+    def expected_days_in_state(
+        p0: np.ndarray,
+        transitions: np.ndarray,
+        days: int,
+        state: DailyState = DailyState.S2_STABLE,
+    ) -> np.ndarray:
+        """
+        Expected number of the next `days` days spent in `state`, shape (N,).
+
+        Uses the block identity [[P, P], [0, I]]^k = [[P^k, P + ... + P^k], [0, I]],
+        so the cumulative sum needs one batched matrix power.
+        """
+        transitions = np.asarray(transitions, dtype=float)
+        n = transitions.shape[0]
+        block = np.zeros((n, 6, 6), dtype=float)
+        block[:, :3, :3] = transitions
+        block[:, :3, 3:] = transitions
+        block[:, 3:, 3:] = np.eye(3)
+        cumulative = np.linalg.matrix_power(block, days)[:, :3, 3:]
+        occupancy = np.einsum("ni,nij->nj", np.asarray(p0, dtype=float), cumulative)
+        return occupancy[:, STATE_INDEX[DailyState(state)]]
+
+    @staticmethod
+    def expected_days_to_relapse(transitions: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Closed-form first-passage statistics with S0 treated as absorbing.
+
+        Returns (days_to_relapse, days_in_s2) with shape (N, 2), columns for
+        starting in S1 and S2: the expected number of days until the first
+        S0 day, and the expected days spent in S2 before it. Users who can
+        never relapse get inf.
+        """
+        transitions = np.asarray(transitions, dtype=float)
+        s1, s2 = STATE_INDEX[DailyState.S1_WITHDRAWAL], STATE_INDEX[DailyState.S2_STABLE]
+        q11 = transitions[:, s1, s1]
+        q12 = transitions[:, s1, s2]
+        q21 = transitions[:, s2, s1]
+        q22 = transitions[:, s2, s2]
+
+        # Fundamental matrix N = (I - Q)^-1 of the transient block, inverted
+        # element-wise since Q is 2x2.
+        det = (1.0 - q11) * (1.0 - q22) - q12 * q21
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inv_det = np.where(det > 1e-12, 1.0 / det, np.inf)
+            n11 = (1.0 - q22) * inv_det
+            n12 = q12 * inv_det
+            n21 = q21 * inv_det
+            n22 = (1.0 - q11) * inv_det
+            days_to_relapse = np.stack([n11 + n12, n21 + n22], axis=1)
+            days_in_s2 = np.stack([n12, n22], axis=1)
+        return (
+            np.nan_to_num(days_to_relapse, nan=np.inf, posinf=np.inf),
+            np.nan_to_num(days_in_s2, nan=np.inf, posinf=np.inf),
+        )
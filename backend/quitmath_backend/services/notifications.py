@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import random
+from collections import deque
+from dataclasses import astuple, dataclass, fields
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Protocol, Sequence
+
+import numpy as np
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..database import AsyncSessionLocal, engine as db_engine
+from ..models import NotificationOutbox, UserLatentState, UserODEParams
+from .ode_engine import CravingODEEngine, ODEParams
+
+logger = logging.getLogger(__name__)
+
+HIGH_CRAVING = "high_craving"
+_PARAM_NAMES = tuple(f.name for f in fields(ODEParams))
+
+
+@dataclass
+class NotificationConfig:
+    page_size: int = 500
+    active_days: int = 3
+    lookahead_minutes: float = 60.0
+    catchup_minutes: float = 360.0
+    dt_minutes: float = 5.0
+    threshold: float = 0.7
+    min_interval_minutes: float = 180.0
+    jitter_seconds: float = 120.0
+    dispatch_batch: int = 500
+    max_attempts: int = 5
+
+
+class PushGateway(Protocol):
+    async def send(self, notification: NotificationOutbox) -> None: ...
+
+
+class LocalPushGateway:
+    """
+    Stand-in for the push provider: logs each notification and keeps the
+    most recent ones in memory.
+    """
+
+    def __init__(self, keep: int = 1000) -> None:
+        self.delivered: deque[tuple[int, str, datetime]] = deque(maxlen=keep)
+
+    async def send(self, notification: NotificationOutbox) -> None:
+        logger.info(
+            "push to user %d: %s (C=%.2f at %s)",
+            notification.user_id,
+            notification.kind,
+            notification.predicted_craving,
+            notification.peak_at,
+        )
+        self.delivered.append((notification.user_id, notification.kind, datetime.utcnow()))
+
+
+def predict_peaks(
+    x: np.ndarray,
+    elapsed_minutes: np.ndarray,
+    params: dict[str, np.ndarray],
+    config: NotificationConfig,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Peak predicted craving and its offset in minutes from now, per user, over
+    the next lookahead_minutes. Each user's latent-state snapshot (N, 3) is
+    first advanced by the time since it was taken, capped at catchup_minutes,
+    on the same batched grid.
+    """
+    dt = config.dt_minutes
+    window = int(config.lookahead_minutes / dt) + 1
+    catchup = np.clip(np.round(elapsed_minutes / dt), 0, int(config.catchup_minutes / dt)).astype(np.intp)
+    horizon = (int(catchup.max(initial=0)) + window - 1) * dt
+    _, c, _, _ = CravingODEEngine().simulate_batch(
+        x[:, 0],
+        x[:, 1],
+        x[:, 2],
+        horizon_minutes=horizon,
+        dt_minutes=dt,
+        params=params,
+        method="exact",
+    )
+    ahead = np.take_along_axis(c, catchup[:, None] + np.arange(window), axis=1)
+    peak_idx = ahead.argmax(axis=1)
+    return ahead[np.arange(ahead.shape[0]), peak_idx], peak_idx * dt
+
+
+class CravingNotifier:
+    """
+    Scans the cohort for predicted high craving and delivers notifications
+    through a durable outbox.
+
+    scan() pages through latent-state snapshots updated in the last
+    active_days by user id, predicts every page in one batched simulation
+    under each user's own parameters, and inserts an outbox row for each user
+    whose peak reaches threshold and who has no notification from the last
+    min_interval_minutes. Users without calibrated parameters are skipped:
+    under the defaults C saturates within minutes from any state, so every
+    one of them would be notified each interval. States and parameters come
+    from one joined column query, and the per-row work runs in a worker thread, so small
+    pages keep the event loop responsive. Each row's send_after is jittered
+    by up to jitter_seconds so a cycle's pushes are spread out rather than
+    sent as one burst. dispatch() drains due rows in batches, sending each
+    batch concurrently and retrying failures with exponential backoff up to
+    max_attempts. Each page and each dispatch batch is its own transaction.
+    """
+
+    def __init__(
+        self,
+        config: NotificationConfig | None = None,
+        gateway: PushGateway | None = None,
+        rng: random.Random | None = None,
+    ) -> None:
+        self.config = config or NotificationConfig()
+        self.gateway = gateway or LocalPushGateway()
+        self.rng = rng or random.Random()
+
+    async def scan(self, now: datetime | None = None) -> int:
+        now = now or datetime.utcnow()
+        active_since = now - timedelta(days=self.config.active_days)
+        enqueued = 0
+        last_id = 0
+        while True:
+            async with AsyncSessionLocal() as session:
+                rows = (
+                    await session.execute(
+                        select(
+                            UserLatentState.user_id,
+                            UserLatentState.updated_at,
+                            UserLatentState.c,
+                            UserLatentState.a,
+                            UserLatentState.r,
+                            *(getattr(UserODEParams, name) for name in _PARAM_NAMES),
+                        )
+                        .join(UserODEParams, UserODEParams.user_id == UserLatentState.user_id)
+                        .where(UserLatentState.user_id > last_id, UserLatentState.updated_at >= active_since)
+                        .order_by(UserLatentState.user_id)
+                        .limit(self.config.page_size)
+                    )
+                ).all()
+                if not rows:
+                    return enqueued
+                last_id = rows[-1][0]
+                enqueued += await self._scan_page(session, rows, now)
+                await session.commit()
+
+    async def dispatch(self, now: datetime | None = None) -> int:
+        now = now or datetime.utcnow()
+        sent = 0
+        while True:
+            async with AsyncSessionLocal() as session:
+                due = (
+                    await session.scalars(
+                        select(NotificationOutbox)
+                        .where(NotificationOutbox.status == "pending", NotificationOutbox.send_after <= now)
+                        .order_by(NotificationOutbox.send_after)
+                        .limit(self.config.dispatch_batch)
+                        .with_for_update(skip_locked=True)
+                    )
+                ).all()
+                results = await asyncio.gather(
+                    *(self.gateway.send(notification) for notification in due), return_exceptions=True
+                )
+                delivered = []
+                for notification, result in zip(due, results):
+                    if not isinstance(result, Exception):
+                        delivered.append(notification.id)
+                        continue
+                    notification.attempts += 1
+                    notification.last_error = str(result)[:255]
+                    if notification.attempts >= self.config.max_attempts:
+                        notification.status = "failed"
+                    else:
+                        notification.send_after = now + timedelta(minutes=2**notification.attempts)
+                if delivered:
+                    await session.execute(
+                        update(NotificationOutbox)
+                        .where(NotificationOutbox.id.in_(delivered))
+                        .values(status="sent", sent_at=datetime.utcnow())
+                        .execution_options(synchronize_session=False)
+                    )
+                sent += len(delivered)
+                await session.commit()
+            if len(due) < self.config.dispatch_batch:
+                return sent
+
+    async def run_cycle(self) -> tuple[int, int]:
+        return await self.scan(), await self.dispatch()
+
+    async def _scan_page(self, session: AsyncSession, rows: Sequence, now: datetime) -> int:
+        recent = set(
+            (
+                await session.scalars(
+                    select(NotificationOutbox.user_id).where(
+                        NotificationOutbox.user_id.in_([row[0] for row in rows]),
+                        NotificationOutbox.created_at
+                        >= now - timedelta(minutes=self.config.min_interval_minutes),
+                    )
+                )
+            ).all()
+        )
+        outbox = await asyncio.to_thread(self._plan_page, rows, recent, now)
+        if outbox:
+            await session.execute(insert(NotificationOutbox), outbox)
+        return len(outbox)
+
+    def _plan_page(self, rows: Sequence, recent: set[int], now: datetime) -> list[dict]:
+        # Runs in a worker thread: everything per-row stays off the event loop.
+        user_ids = [row[0] for row in rows]
+        elapsed = np.array([(now - row[1]).total_seconds() / 60.0 for row in rows])
+        values = np.array([row[2:] for row in rows], dtype=float)
+        x = values[:, :3]
+        params = {name: values[:, 3 + i] for i, name in enumerate(_PARAM_NAMES)}
+
+        peaks, offsets = predict_peaks(x, elapsed, params, self.config)
+
+        outbox = []
+        for k in np.flatnonzero(peaks >= self.config.threshold).tolist():
+            if user_ids[k] in recent:
+                continue
+            outbox.append(
+                {
+                    "user_id": user_ids[k],
+                    "kind": HIGH_CRAVING,
+                    "predicted_craving": float(peaks[k]),
+                    "peak_at": now + timedelta(minutes=float(offsets[k])),
+                    "created_at": now,
+                    "send_after": now + timedelta(seconds=self.rng.uniform(0.0, self.config.jitter_seconds)),
+                    "status": "pending",
+                    "attempts": 0,
+                }
+            )
+        return outbox
+
+
+class NotificationScheduler:
+    """
+    Runs CravingNotifier.run_cycle() every interval_seconds on the event loop.
+    """
+
+    def __init__(self, notifier: CravingNotifier, interval_seconds: float) -> None:
+        self.notifier = notifier
+        self.interval_seconds = interval_seconds
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def run_forever(self) -> None:
+        """
+        Runs in the foreground until cancelled (Ctrl-C under main --loop),
+        then stops and closes the database connections.
+        """
+        await self.start()
+        try:
+            await self._task
+        finally:
+            await self.stop()
+            await db_engine.dispose()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                enqueued, sent = await self.notifier.run_cycle()
+                if enqueued or sent:
+                    logger.info("Enqueued %d and sent %d craving notifications", enqueued, sent)
+            except Exception:
+                logger.exception("Craving notification cycle failed")
+            await asyncio.sleep(self.interval_seconds)
+
+
+@lru_cache
+def get_notification_scheduler() -> NotificationScheduler:
+    settings = get_settings()
+    config = NotificationConfig(
+        page_size=settings.notify_page_size,
+        active_days=settings.notify_active_days,
+        lookahead_minutes=settings.notify_lookahead_minutes,
+        catchup_minutes=settings.notify_catchup_minutes,
+        dt_minutes=settings.notify_dt_minutes,
+        threshold=settings.notify_threshold,
+        min_interval_minutes=settings.notify_min_interval_minutes,
+        jitter_seconds=settings.notify_jitter_seconds,
+        dispatch_batch=settings.notify_dispatch_batch,
+        max_attempts=settings.notify_max_attempts,
+    )
+    return NotificationScheduler(CravingNotifier(config), settings.notify_interval_seconds)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Scan for predicted high craving and send notifications.")
+    parser.add_argument("--loop", action="store_true", help="Keep running every notify_interval_seconds.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    scheduler = get_notification_scheduler()
+    if args.loop:
+        asyncio.run(scheduler.run_forever())
+    else:
+        enqueued, sent = asyncio.run(scheduler.notifier.run_cycle())
+        print(f"enqueued {enqueued}, sent {sent}")
+
+
+if __name__ == "__main__":
+    main()
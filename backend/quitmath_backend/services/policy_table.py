@@ -0,0 +1,184 @@
+import asyncio
+import json
+import logging
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from ..config import get_settings
+from .rl_scheduler import RLScheduler
+from .sim_executor import get_simulation_executor
+from .trajectory_cache import params_fingerprint
+
+logger = logging.getLogger(__name__)
+
+_PAD = -1
+
+
+class PolicyTable:
+    """
+    Precomputed RLScheduler schedules on a regular grid over [0, 1]^3.
+
+    offsets has shape (G, G, G, K): minute offsets for the grid state
+    (c, a, r) = (i, j, k) / (G - 1), padded with -1 up to K tasks. Lookups
+    snap to the nearest grid state, so a suggestion costs one array index.
+    Tables are saved as a .npy array plus a .json sidecar and can be loaded
+    memory-mapped, sharing pages across worker processes.
+    """
+
+    def __init__(self, offsets: np.ndarray, fingerprint: str) -> None:
+        if offsets.ndim != 4 or not (offsets.shape[0] == offsets.shape[1] == offsets.shape[2]):
+            raise ValueError("offsets must have shape (G, G, G, K).")
+        self.offsets = offsets
+        self.fingerprint = fingerprint
+        self.resolution = offsets.shape[0]
+
+    @classmethod
+    def build(cls, scheduler: RLScheduler, resolution: int = 21) -> "PolicyTable":
+        if resolution < 2:
+            raise ValueError("resolution must be at least 2.")
+        axis = np.linspace(0.0, 1.0, resolution)
+        c0, a0, r0 = (g.reshape(-1) for g in np.meshgrid(axis, axis, axis, indexing="ij"))
+        schedules = scheduler.suggest_task_schedule_batch(c0, a0, r0)
+
+        max_tasks = scheduler.config.max_tasks_per_hour
+        flat = np.full((len(schedules), max_tasks), _PAD, dtype=np.int16)
+        for row, offsets in enumerate(schedules):
+            flat[row, : len(offsets)] = offsets
+        table = flat.reshape(resolution, resolution, resolution, max_tasks)
+        return cls(table, fingerprint_for(scheduler))
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(path.with_suffix(".npy"), self.offsets)
+        path.with_suffix(".json").write_text(
+            json.dumps({"fingerprint": self.fingerprint, "resolution": self.resolution})
+        )
+
+    @classmethod
+    def load(cls, path: str | Path, mmap: bool = True) -> "PolicyTable":
+        path = Path(path)
+        meta = json.loads(path.with_suffix(".json").read_text())
+        offsets = np.load(path.with_suffix(".npy"), mmap_mode="r" if mmap else None)
+        return cls(offsets, meta["fingerprint"])
+
+    def grid_index(self, c: float, a: float, r: float) -> tuple[int, int, int]:
+        scale = self.resolution - 1
+        return tuple(  # type: ignore[return-value]
+            int(round(min(1.0, max(0.0, v)) * scale)) for v in (c, a, r)
+        )
+
+    def lookup(self, c: float, a: float, r: float) -> list[int]:
+        row = self.offsets[self.grid_index(c, a, r)]
+        return [int(v) for v in row if v != _PAD]
+
+    def verify(
+        self,
+        scheduler: RLScheduler,
+        n_samples: int = 1000,
+        seed: int = 0,
+    ) -> dict:
+        """
+        Compares lookups against the live heuristic at random states and
+        reports every disagreement. Differences come from snapping off-grid
+        states; grid states themselves always match for a fresh table.
+        """
+        rng = np.random.default_rng(seed)
+        states = rng.random((n_samples, 3))
+        live = scheduler.suggest_task_schedule_batch(states[:, 0], states[:, 1], states[:, 2])
+        mismatches = []
+        for (c, a, r), expected in zip(states.tolist(), live):
+            got = self.lookup(c, a, r)
+            if got != expected:
+                mismatches.append({"c": c, "a": a, "r": r, "table": got, "live": expected})
+        return {
+            "checked": n_samples,
+            "mismatches": len(mismatches),
+            "mismatch_rate": len(mismatches) / n_samples if n_samples else 0.0,
+            "fingerprint_ok": self.fingerprint == fingerprint_for(scheduler),
+            "examples": mismatches[:20],
+        }
+
+
+def fingerprint_for(scheduler: RLScheduler) -> str:
+    return params_fingerprint(scheduler.engine.params, scheduler.config)
+
+
+def load_or_build(path: str | None, resolution: int) -> PolicyTable:
+    """
+    The saved table at path if it was built for the current parameters,
+    otherwise a fresh build, re-saved when a path is given. Runs in the
+    simulation pool, so it is a module-level function.
+    """
+    scheduler = RLScheduler()
+    if path and Path(path).with_suffix(".npy").exists():
+        table = PolicyTable.load(path, mmap=False)
+        if table.fingerprint == fingerprint_for(scheduler):
+            return table
+        logger.info("Policy table at %s is stale; rebuilding.", path)
+
+    table = PolicyTable.build(scheduler, resolution=resolution)
+    if path:
+        table.save(path)
+    return table
+
+
+class PolicyTableLoader:
+    """
+    Holds the process-wide table. start() loads or builds it on the
+    simulation pool in the background; until it is ready, and whenever it is
+    disabled, table is None and callers compute schedules live. The table
+    only encodes the heuristic policy, so it is never built for another one.
+    """
+
+    def __init__(self, enabled: bool, path: str | None = None, resolution: int = 21) -> None:
+        self.enabled = enabled
+        self.path = path
+        self.resolution = resolution
+        self.table: PolicyTable | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._load())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _load(self) -> None:
+        try:
+            table = await get_simulation_executor().run(load_or_build, self.path, self.resolution)
+        except Exception:
+            logger.exception("Building the policy table failed; suggestions stay live.")
+            return
+        # Re-open a saved table memory-mapped so worker processes share its pages.
+        self.table = PolicyTable.load(self.path) if self.path else table
+        logger.info("Policy table ready (resolution %d).", self.table.resolution)
+
+
+@lru_cache
+def get_policy_table_loader() -> PolicyTableLoader:
+    settings = get_settings()
+    enabled = settings.rl_policy_table_enabled
+    if enabled and settings.rl_scheduler_policy != "heuristic":
+        logger.warning(
+            "rl_policy_table_enabled is ignored with rl_scheduler_policy=%s.", settings.rl_scheduler_policy
+        )
+        enabled = False
+    return PolicyTableLoader(
+        enabled,
+        path=settings.rl_policy_table_path,
+        resolution=settings.rl_policy_table_resolution,
+    )
+
+
+def get_policy_table() -> PolicyTable | None:
+    return get_policy_table_loader().table
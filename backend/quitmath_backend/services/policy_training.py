@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+from ..models import DailyState
+from .learned_policy import LearnedPolicy, enforce_schedule_limits, policy_features
+from .markov_model import STATE_INDEX, DailyMarkovModel, MarkovParams
+from .ode_engine import CravingODEEngine, ODEParams
+from .rl_scheduler import RLSchedulerConfig
+
+
+@dataclass
+class TrainingConfig:
+    iterations: int = 200
+    episodes_per_iteration: int = 4096
+    learning_rate: float = 0.05
+    slot_minutes: float = 5.0
+    task_minutes: float = 3.0
+    task_reward: float = 0.15
+    task_cost: float = 0.01
+    relapse_weight: float = 0.5
+    workers: int = 0
+    seed: int = 0
+
+
+class SchedulingEnv:
+    """
+    Vectorized scheduling environment: every episode starts from a random
+    (C, A, R), places tasks in the chosen slots of one scheduler horizon, and
+    all episodes are simulated in lockstep with simulate_batch.
+
+    A task drives u = 1 for task_minutes and ends with a task_reward pulse.
+    The return is minus the mean craving over the horizon, minus task_cost per
+    task, minus relapse_weight times the Markov S1 -> S0 probability implied
+    by the episode's average C/A/R.
+    """
+
+    def __init__(
+        self,
+        ode_params: ODEParams | None = None,
+        scheduler_config: RLSchedulerConfig | None = None,
+        training_config: TrainingConfig | None = None,
+        markov_params: MarkovParams | None = None,
+    ) -> None:
+        self.engine = CravingODEEngine(ode_params)
+        self.scheduler_config = scheduler_config or RLSchedulerConfig()
+        self.training_config = training_config or TrainingConfig()
+        self.markov = DailyMarkovModel(markov_params)
+
+        sc, tc = self.scheduler_config, self.training_config
+        self.n_slots = int(round(sc.horizon_minutes / tc.slot_minutes))
+        self.min_gap_slots = max(1, int(np.ceil(60.0 / sc.max_tasks_per_hour / tc.slot_minutes)))
+        self.max_tasks = sc.max_tasks_per_hour
+        self.n_steps = int(sc.horizon_minutes / sc.dt_minutes) + 1
+
+        # Per-slot input templates on the simulation grid: u while the task
+        # runs and the reward pulse landing when it ends.
+        grid = np.arange(self.n_steps) * sc.dt_minutes
+        starts = np.arange(self.n_slots) * tc.slot_minutes
+        ends = starts + tc.task_minutes
+        self._u_template = ((grid >= starts[:, None]) & (grid < ends[:, None])).astype(float)
+        end_idx = np.minimum(np.ceil(ends / sc.dt_minutes).astype(np.intp), self.n_steps - 1)
+        self._reward_template = np.zeros((self.n_slots, self.n_steps), dtype=float)
+        self._reward_template[np.arange(self.n_slots), np.maximum(end_idx - 1, 0)] = tc.task_reward
+
+    def sample_states(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        return rng.random((n, 3))
+
+    def rollout(self, states: np.ndarray, chosen: np.ndarray) -> np.ndarray:
+        actions = enforce_schedule_limits(chosen, self.min_gap_slots, self.max_tasks).astype(float)
+        u = np.minimum(actions @ self._u_template, 1.0)
+        pulses = actions @ self._reward_template
+        _, c, a, r = self.engine.simulate_batch(
+            states[:, 0],
+            states[:, 1],
+            states[:, 2],
+            horizon_minutes=self.scheduler_config.horizon_minutes,
+            dt_minutes=self.scheduler_config.dt_minutes,
+            u_schedule=u,
+            reward_pulses=pulses,
+            method="exact",
+        )
+        mean_c = c.mean(axis=1)
+        transitions = self.markov.transition_matrices(mean_c, a.mean(axis=1), r.mean(axis=1))
+        p_relapse = transitions[
+            :, STATE_INDEX[DailyState.S1_WITHDRAWAL], STATE_INDEX[DailyState.S0_SMOKING]
+        ]
+        tc = self.training_config
+        return -mean_c - tc.task_cost * actions.sum(axis=1) - tc.relapse_weight * p_relapse
+
+
+def _collect(
+    env: SchedulingEnv,
+    theta: np.ndarray,
+    seed: tuple[int, ...],
+    n_episodes: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    states = env.sample_states(rng, n_episodes)
+    features = policy_features(states[:, 0], states[:, 1], states[:, 2])
+    probs = 1.0 / (1.0 + np.exp(-(features @ theta)))
+    chosen = rng.random(probs.shape) < probs
+    returns = env.rollout(states, chosen)
+    return features, probs, chosen.astype(float), returns
+
+
+class PolicyGradientTrainer:
+    """
+    REINFORCE with a per-iteration least-squares state baseline and Adam
+    updates, for the Bernoulli-per-slot LearnedPolicy. Episodes for each
+    iteration are split across a spawn process pool when workers > 0.
+    """
+
+    def __init__(self, env: SchedulingEnv) -> None:
+        self.env = env
+        self.config = env.training_config
+
+    def train(
+        self,
+        on_iteration: Callable[[int, float], None] | None = None,
+    ) -> LearnedPolicy:
+        cfg = self.config
+        theta = np.zeros((10, self.env.n_slots), dtype=float)
+        m = np.zeros_like(theta)
+        v = np.zeros_like(theta)
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+
+        pool = None
+        if cfg.workers > 0:
+            pool = ProcessPoolExecutor(
+                max_workers=cfg.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        try:
+            for it in range(cfg.iterations):
+                features, probs, actions, returns = self._gather(pool, theta, it)
+                w, *_ = np.linalg.lstsq(features, returns, rcond=None)
+                advantage = returns - features @ w
+                advantage /= advantage.std() + eps
+                grad = features.T @ ((actions - probs) * advantage[:, None]) / returns.shape[0]
+
+                m = beta1 * m + (1.0 - beta1) * grad
+                v = beta2 * v + (1.0 - beta2) * grad * grad
+                m_hat = m / (1.0 - beta1 ** (it + 1))
+                v_hat = v / (1.0 - beta2 ** (it + 1))
+                theta += cfg.learning_rate * m_hat / (np.sqrt(v_hat) + eps)
+
+                if on_iteration is not None:
+                    on_iteration(it, float(returns.mean()))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        return LearnedPolicy(
+            theta=theta,
+            slot_minutes=cfg.slot_minutes,
+            min_gap_slots=self.env.min_gap_slots,
+            max_tasks=self.env.max_tasks,
+        )
+
+    def _gather(self, pool, theta: np.ndarray, iteration: int):
+        cfg = self.config
+        if pool is None:
+            return _collect(self.env, theta, (cfg.seed, iteration), cfg.episodes_per_iteration)
+        share = -(-cfg.episodes_per_iteration // cfg.workers)
+        futures = [
+            pool.submit(_collect, self.env, theta, (cfg.seed, iteration, w), share)
+            for w in range(cfg.workers)
+        ]
+        parts = [f.result() for f in futures]
+        return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train a policy-gradient task scheduler.")
+    parser.add_argument("output", help="Checkpoint path (.npz) for RLSchedulerConfig.checkpoint_path")
+    parser.add_argument("--iterations", type=int, default=TrainingConfig.iterations)
+    parser.add_argument("--episodes", type=int, default=TrainingConfig.episodes_per_iteration)
+    parser.add_argument("--workers", type=int, default=TrainingConfig.workers)
+    parser.add_argument("--seed", type=int, default=TrainingConfig.seed)
+    args = parser.parse_args()
+
+    config = TrainingConfig(
+        iterations=args.iterations,
+        episodes_per_iteration=args.episodes,
+        workers=args.workers,
+        seed=args.seed,
+    )
+    env = SchedulingEnv(scheduler_config=RLSchedulerConfig(policy="heuristic"), training_config=config)
+    trainer = PolicyGradientTrainer(env)
+    policy = trainer.train(
+        on_iteration=lambda it, mean_return: print(f"iter {it:4d}  mean return {mean_return:.4f}")
+    )
+    policy.save(args.output)
+
+
+if __name__ == "__main__":
+    main()
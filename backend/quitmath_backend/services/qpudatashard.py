@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import calendar
+import csv
+import io
+import math
+import sys
+from dataclasses import astuple, dataclass, fields
+from datetime import date, datetime
+from typing import AsyncIterator, Iterable, Iterator, Literal
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..database import AsyncSessionLocal, dialect_insert
+from ..models import EcoImpact, EcoShardRow, User
+
+SHARD_COLUMNS: tuple[str, ...] = (
+    "nodeid",
+    "category",
+    "region",
+    "parameter",
+    "unit",
+    "baselinevalue",
+    "improvedvalue",
+    "period",
+    "ecoimpactscore",
+    "karmaperunit",
+    "notes",
+)
+_TEXT_COLUMNS = ("nodeid", "category", "region", "parameter", "unit")
+_NUMBER_COLUMNS = ("baselinevalue", "improvedvalue", "ecoimpactscore", "karmaperunit")
+
+ShardPeriod = Literal["year", "month"]
+
+
+class ShardValidationError(ValueError):
+    """
+    Raised for a shard that does not follow the EcoNet schema; the message
+    names the offending CSV line.
+    """
+
+
+@dataclass
+class ShardRecord:
+    nodeid: str
+    category: str
+    region: str
+    parameter: str
+    unit: str
+    baselinevalue: float
+    improvedvalue: float
+    period: date
+    ecoimpactscore: float
+    karmaperunit: float
+    notes: str = ""
+
+
+def parse_shard_record(values: list[str], line: int) -> ShardRecord:
+    if len(values) != len(SHARD_COLUMNS):
+        raise ShardValidationError(
+            f"line {line}: expected {len(SHARD_COLUMNS)} fields, got {len(values)}"
+        )
+    raw = dict(zip(SHARD_COLUMNS, (v.strip() for v in values)))
+    parsed: dict[str, object] = {"notes": raw["notes"]}
+    for name in _TEXT_COLUMNS:
+        if not raw[name]:
+            raise ShardValidationError(f"line {line}: {name} is empty")
+        parsed[name] = raw[name]
+    for name in _NUMBER_COLUMNS:
+        try:
+            number = float(raw[name])
+        except ValueError:
+            raise ShardValidationError(f"line {line}: {name} is not a number: {raw[name]!r}")
+        if not math.isfinite(number):
+            raise ShardValidationError(f"line {line}: {name} must be finite")
+        parsed[name] = number
+    try:
+        parsed["period"] = date.fromisoformat(raw["period"])
+    except ValueError:
+        raise ShardValidationError(f"line {line}: period is not an ISO date: {raw['period']!r}")
+    if not 0.0 <= parsed["ecoimpactscore"] <= 1.0:
+        raise ShardValidationError(f"line {line}: ecoimpactscore must be within [0, 1]")
+    if parsed["karmaperunit"] < 0.0:
+        raise ShardValidationError(f"line {line}: karmaperunit must be non-negative")
+    return ShardRecord(**parsed)
+
+
+def iter_shard_chunks(lines: Iterable[str], chunk_rows: int = 1000) -> Iterator[list[ShardRecord]]:
+    """
+    Parses a shard lazily from an iterable of text lines (an open file, an
+    upload stream), yielding validated records chunk_rows at a time.
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None or tuple(h.strip().lower() for h in header) != SHARD_COLUMNS:
+        raise ShardValidationError(f"line 1: header must be {','.join(SHARD_COLUMNS)}")
+    chunk: list[ShardRecord] = []
+    for values in reader:
+        if not any(v.strip() for v in values):
+            continue
+        chunk.append(parse_shard_record(values, reader.line_num))
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def load_shard(
+    session: AsyncSession,
+    lines: Iterable[str],
+    source: str,
+    chunk_rows: int = 1000,
+) -> int:
+    """
+    Bulk-loads a shard into eco_shard_rows one chunk per INSERT, inside the
+    caller's transaction. Rows already present for the same node, parameter
+    and period are overwritten, so re-importing a corrected shard is safe.
+    Returns the number of rows loaded.
+    """
+    loaded = 0
+    columns = [f.name for f in fields(ShardRecord)]
+    for chunk in iter_shard_chunks(lines, chunk_rows):
+        stmt = dialect_insert(session, EcoShardRow).values(
+            [{"source": source, **dict(zip(columns, astuple(r)))} for r in chunk]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["nodeid", "parameter", "period"],
+            set_={name: getattr(stmt.excluded, name) for name in ["source", *columns]},
+        )
+        await session.execute(stmt)
+        loaded += len(chunk)
+    return loaded
+
+
+def period_end(key: str) -> date:
+    """
+    Last day of a "YYYY" or "YYYY-MM" period key.
+    """
+    if len(key) == 4:
+        return date(int(key), 12, 31)
+    year, month = int(key[:4]), int(key[5:7])
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _period_key(session: AsyncSession, column, period: ShardPeriod):
+    if session.bind.dialect.name == "postgresql":
+        return func.to_char(column, "YYYY" if period == "year" else "YYYY-MM")
+    return func.strftime("%Y" if period == "year" else "%Y-%m", column)
+
+
+async def iter_export_records(
+    session: AsyncSession,
+    period: ShardPeriod = "year",
+    since: datetime | None = None,
+    until: datetime | None = None,
+    chunk_rows: int = 1000,
+) -> AsyncIterator[ShardRecord]:
+    """
+    Aggregates the eco_impacts ledger into one shard record per region,
+    period and metric. The GROUP BY runs in the database and results arrive
+    through a server-side cursor, so memory stays constant however many users
+    and entries are covered.
+
+    Each record reports the metric's total as improvedvalue over a zero
+    baseline, karma per unit of that total, and an ecoimpactscore of
+    1 - exp(-karma per contributing user).
+    """
+    settings = get_settings()
+    region = func.coalesce(User.region, settings.shard_default_region)
+    key = _period_key(session, EcoImpact.timestamp, period)
+    stmt = (
+        select(
+            region,
+            key,
+            EcoImpact.metric,
+            EcoImpact.unit,
+            func.sum(EcoImpact.value),
+            func.sum(EcoImpact.karma),
+            func.count(func.distinct(EcoImpact.user_id)),
+            func.count(EcoImpact.id),
+        )
+        .join(User, User.id == EcoImpact.user_id)
+        .group_by(region, key, EcoImpact.metric, EcoImpact.unit)
+        .order_by(region, key, EcoImpact.metric, EcoImpact.unit)
+    )
+    if since is not None:
+        stmt = stmt.where(EcoImpact.timestamp >= since)
+    if until is not None:
+        stmt = stmt.where(EcoImpact.timestamp < until)
+
+    result = await session.stream(stmt.execution_options(yield_per=chunk_rows))
+    async for region_name, period_key, metric, unit, value, karma, users, entries in result:
+        value, karma = float(value or 0.0), float(karma or 0.0)
+        yield ShardRecord(
+            nodeid=f"{settings.shard_node_prefix}-{region_name}",
+            category="QuitMathCompanion",
+            region=region_name,
+            parameter=metric,
+            unit=unit,
+            baselinevalue=0.0,
+            improvedvalue=value,
+            period=period_end(period_key),
+            ecoimpactscore=round(1.0 - math.exp(-karma / users), 4) if users else 0.0,
+            karmaperunit=karma / value if value else 0.0,
+            notes=f"Aggregated from {entries} eco-impact entries across {users} users.",
+        )
+
+
+async def stream_shard_csv(
+    period: ShardPeriod = "year",
+    since: datetime | None = None,
+    until: datetime | None = None,
+    chunk_rows: int = 1000,
+) -> AsyncIterator[str]:
+    """
+    Yields the export as CSV text, chunk_rows records per piece. Opens its
+    own session so it can outlive the request handler that returns it.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(SHARD_COLUMNS)
+    pending = 0
+    async with AsyncSessionLocal() as session:
+        async for record in iter_export_records(session, period, since, until, chunk_rows):
+            writer.writerow(
+                [f"{v:.12g}" if isinstance(v, float) else v for v in astuple(record)]
+            )
+            pending += 1
+            if pending >= chunk_rows:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def _import_file(path: str, chunk_rows: int) -> int:
+    async with AsyncSessionLocal() as session:
+        with open(path, newline="", encoding="utf-8") as f:
+            loaded = await load_shard(session, f, source=path, chunk_rows=chunk_rows)
+        await session.commit()
+    return loaded
+
+
+async def _export(period: ShardPeriod, chunk_rows: int, out) -> None:
+    async for piece in stream_shard_csv(period, chunk_rows=chunk_rows):
+        out.write(piece)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import or export EcoNet qpudatashard CSVs.")
+    parser.add_argument("--chunk-rows", type=int, default=get_settings().shard_chunk_rows)
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="Load a shard CSV into eco_shard_rows.")
+    imp.add_argument("path")
+    exp = sub.add_parser("export", help="Write eco-impact aggregates as a shard CSV.")
+    exp.add_argument("--period", choices=["year", "month"], default="year")
+    exp.add_argument("-o", "--output", help="Output path (default: stdout)")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        loaded = asyncio.run(_import_file(args.path, args.chunk_rows))
+        print(f"loaded {loaded} shard rows from {args.path}")
+    elif args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as out:
+            asyncio.run(_export(args.period, args.chunk_rows, out))
+    else:
+        asyncio.run(_export(args.period, args.chunk_rows, sys.stdout))
+
+
+if __name__ == "__main__":
+    main()
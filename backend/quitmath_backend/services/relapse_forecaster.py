@@ -0,0 +1,410 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime
+from functools import lru_cache
+from multiprocessing.shared_memory import SharedMemory
+from typing import Sequence
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..database import AsyncSessionLocal, dialect_insert, engine as db_engine
+from ..models import DailySession, DailyState, UserLatentState, UserODEParams, UserRelapseForecast
+from .markov_model import STATE_INDEX, DailyMarkovModel, MarkovParams
+from .ode_engine import CravingODEEngine, ODEParams, stack_params
+
+logger = logging.getLogger(__name__)
+
+_Z_95 = 1.959963984540054
+_PARAM_NAMES = tuple(f.name for f in fields(ODEParams))
+
+
+@dataclass
+class ForecastConfig:
+    days: int = 30
+    day_dt_minutes: float = 60.0
+    state_noise: float = 0.05
+    batch_samples: int = 256
+    max_samples: int = 4096
+    ci_halfwidth: float = 0.02
+    users_per_chunk: int = 64
+    workers: int = 0
+    seed: int = 0
+
+
+@dataclass
+class ForecastUser:
+    user_id: int
+    c0: float
+    a0: float
+    r0: float
+    state: DailyState = DailyState.S1_WITHDRAWAL
+    ode_params: ODEParams = field(default_factory=ODEParams)
+
+
+@dataclass
+class RelapseForecast:
+    user_id: int
+    relapse_prob: list[float]
+    relapse_lower: list[float]
+    relapse_upper: list[float]
+    expected_streak_days: float
+    samples: int
+
+
+class RelapseForecaster:
+    """
+    Monte Carlo relapse forecaster chaining the ODE and Markov layers per day.
+
+    Each sampled day starts from the previous day's end state plus Gaussian
+    noise, runs CravingODEEngine for 24h to get the day's average C/A/R, and
+    draws tomorrow's DailyState from DailyMarkovModel. Samples are drawn in
+    batches and a user stops once the 95% Wilson interval of every daily
+    relapse probability is within ci_halfwidth. Each user draws from its own
+    generator seeded by (seed, user_id), so results do not depend on chunking
+    or worker count.
+
+    With workers > 0, chunks of users run in a spawn process pool and write
+    straight into a shared-memory result buffer.
+    """
+
+    def __init__(
+        self,
+        config: ForecastConfig | None = None,
+        markov_params: MarkovParams | None = None,
+    ) -> None:
+        self.config = config or ForecastConfig()
+        self.markov_params = markov_params or MarkovParams()
+
+    def forecast(self, users: Sequence[ForecastUser]) -> list[RelapseForecast]:
+        cfg = self.config
+        n_users = len(users)
+        width = _row_width(cfg.days)
+        shm = SharedMemory(create=True, size=max(1, n_users * width * 8))
+        results = np.ndarray((n_users, width), dtype=float, buffer=shm.buf)
+        try:
+            chunks = [
+                (start, users[start : start + cfg.users_per_chunk])
+                for start in range(0, n_users, cfg.users_per_chunk)
+            ]
+            if cfg.workers > 0 and len(chunks) > 1:
+                ctx = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=cfg.workers, mp_context=ctx) as pool:
+                    futures = [
+                        pool.submit(
+                            _forecast_chunk, shm.name, n_users, start, chunk, cfg, self.markov_params
+                        )
+                        for start, chunk in chunks
+                    ]
+                    for future in futures:
+                        future.result()
+            else:
+                for start, chunk in chunks:
+                    _write_chunk(results, start, chunk, cfg, self.markov_params)
+            return [_unpack(user.user_id, row, cfg.days) for user, row in zip(users, results)]
+        finally:
+            del results
+            shm.close()
+            shm.unlink()
+
+
+class RelapseForecastJob:
+    """
+    Forecasts every user with a latent-state snapshot and stores the result
+    in user_relapse_forecasts, one row per user.
+
+    Users are paged by id, users_per_page at a time; each page is read with
+    one outer-join column query (snapshot, calibrated parameters) plus one
+    query for the latest DailySession state, forecast in a worker thread
+    (which fans out to the forecaster's own process pool) and upserted in
+    its own transaction.
+    """
+
+    def __init__(self, forecaster: RelapseForecaster, users_per_page: int = 5000) -> None:
+        self.forecaster = forecaster
+        self.users_per_page = users_per_page
+
+    async def run(self, now: datetime | None = None) -> int:
+        now = now or datetime.utcnow()
+        written = 0
+        last_id = 0
+        while True:
+            async with AsyncSessionLocal() as session:
+                users = await self._load_page(session, last_id)
+                if not users:
+                    return written
+                last_id = users[-1].user_id
+                forecasts = await asyncio.to_thread(self.forecaster.forecast, users)
+                await self._save(session, forecasts, now)
+                await session.commit()
+                written += len(forecasts)
+
+    async def _load_page(self, session: AsyncSession, after_id: int) -> list[ForecastUser]:
+        rows = (
+            await session.execute(
+                select(
+                    UserLatentState.user_id,
+                    UserLatentState.c,
+                    UserLatentState.a,
+                    UserLatentState.r,
+                    *(getattr(UserODEParams, name) for name in _PARAM_NAMES),
+                )
+                .outerjoin(UserODEParams, UserODEParams.user_id == UserLatentState.user_id)
+                .where(UserLatentState.user_id > after_id)
+                .order_by(UserLatentState.user_id)
+                .limit(self.users_per_page)
+            )
+        ).all()
+        if not rows:
+            return []
+
+        in_page = (DailySession.user_id > after_id, DailySession.user_id <= rows[-1][0])
+        latest = (
+            select(DailySession.user_id, func.max(DailySession.date).label("day"))
+            .where(*in_page)
+            .group_by(DailySession.user_id)
+            .subquery()
+        )
+        states = dict(
+            (
+                await session.execute(
+                    select(DailySession.user_id, DailySession.state).join(
+                        latest,
+                        (DailySession.user_id == latest.c.user_id) & (DailySession.date == latest.c.day),
+                    )
+                )
+            ).all()
+        )
+
+        users = []
+        for row in rows:
+            fitted = row[4:]
+            # Users without a fit have NULL parameter columns from the outer join.
+            params = ODEParams(*fitted) if fitted[0] is not None else ODEParams()
+            users.append(
+                ForecastUser(
+                    user_id=row[0],
+                    c0=row[1],
+                    a0=row[2],
+                    r0=row[3],
+                    state=states.get(row[0], DailyState.S1_WITHDRAWAL),
+                    ode_params=params,
+                )
+            )
+        return users
+
+    async def _save(self, session: AsyncSession, forecasts: Sequence[RelapseForecast], now: datetime) -> None:
+        stmt = dialect_insert(session, UserRelapseForecast)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={
+                c.name: getattr(stmt.excluded, c.name)
+                for c in UserRelapseForecast.__table__.columns
+                if c.name != "user_id"
+            },
+        )
+        await session.execute(
+            stmt,
+            [{**asdict(forecast), "start_date": now.date(), "created_at": now} for forecast in forecasts],
+        )
+
+
+class ForecastScheduler:
+    """
+    Runs RelapseForecastJob.run() every interval_seconds on the event loop;
+    the sampling itself happens off the loop.
+    """
+
+    def __init__(self, job: RelapseForecastJob, interval_seconds: float) -> None:
+        self.job = job
+        self.interval_seconds = interval_seconds
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def run_forever(self) -> None:
+        """
+        Runs in the foreground until cancelled (Ctrl-C under main --loop),
+        then stops and closes the database connections.
+        """
+        await self.start()
+        try:
+            await self._task
+        finally:
+            await self.stop()
+            await db_engine.dispose()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                written = await self.job.run()
+                logger.info("Stored relapse forecasts for %d users", written)
+            except Exception:
+                logger.exception("Relapse forecast run failed")
+            await asyncio.sleep(self.interval_seconds)
+
+
+@lru_cache
+def get_forecast_scheduler() -> ForecastScheduler:
+    settings = get_settings()
+    config = ForecastConfig(
+        days=settings.forecast_days,
+        max_samples=settings.forecast_max_samples,
+        ci_halfwidth=settings.forecast_ci_halfwidth,
+        workers=settings.forecast_workers,
+    )
+    job = RelapseForecastJob(RelapseForecaster(config), users_per_page=settings.forecast_users_per_page)
+    return ForecastScheduler(job, settings.forecast_interval_seconds)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Forecast relapse risk for every user and store the bands.")
+    parser.add_argument("--loop", action="store_true", help="Keep running every forecast_interval_seconds.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    scheduler = get_forecast_scheduler()
+    if args.loop:
+        asyncio.run(scheduler.run_forever())
+    else:
+        written = asyncio.run(scheduler.job.run())
+        print(f"stored relapse forecasts for {written} users")
+
+
+def _row_width(days: int) -> int:
+    # relapse_prob, lower and upper per day, then expected streak and samples.
+    return 3 * days + 2
+
+
+def _unpack(user_id: int, row: np.ndarray, days: int) -> RelapseForecast:
+    return RelapseForecast(
+        user_id=user_id,
+        relapse_prob=row[:days].tolist(),
+        relapse_lower=row[days : 2 * days].tolist(),
+        relapse_upper=row[2 * days : 3 * days].tolist(),
+        expected_streak_days=float(row[3 * days]),
+        samples=int(row[3 * days + 1]),
+    )
+
+
+def _forecast_chunk(
+    shm_name: str,
+    n_users: int,
+    start: int,
+    users: Sequence[ForecastUser],
+    cfg: ForecastConfig,
+    markov_params: MarkovParams,
+) -> None:
+    shm = SharedMemory(name=shm_name)
+    try:
+        results = np.ndarray((n_users, _row_width(cfg.days)), dtype=float, buffer=shm.buf)
+        _write_chunk(results, start, users, cfg, markov_params)
+        del results
+    finally:
+        shm.close()
+
+
+def _wilson(successes: np.ndarray, n: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    p = successes / n
+    denom = 1.0 + _Z_95**2 / n
+    centre = (p + _Z_95**2 / (2.0 * n)) / denom
+    half = _Z_95 * np.sqrt(p * (1.0 - p) / n + _Z_95**2 / (4.0 * n**2)) / denom
+    return centre - half, centre + half
+
+
+def _write_chunk(
+    results: np.ndarray,
+    start: int,
+    users: Sequence[ForecastUser],
+    cfg: ForecastConfig,
+    markov_params: MarkovParams,
+) -> None:
+    engine = CravingODEEngine()
+    markov = DailyMarkovModel(markov_params)
+    days = cfg.days
+    k_users = len(users)
+
+    x0 = np.array([[u.c0, u.a0, u.r0] for u in users], dtype=float)
+    s0 = np.array([STATE_INDEX[DailyState(u.state)] for u in users], dtype=np.intp)
+    params = stack_params([u.ode_params for u in users])
+    rngs = [np.random.default_rng([cfg.seed, u.user_id]) for u in users]
+
+    relapsed = np.zeros((k_users, days), dtype=float)
+    streak_sum = np.zeros(k_users, dtype=float)
+    n_samples = np.zeros(k_users, dtype=float)
+    active = np.ones(k_users, dtype=bool)
+
+    while active.any():
+        idx = np.flatnonzero(active)
+        batch = cfg.batch_samples
+        lanes = idx.shape[0] * batch
+        noise = np.concatenate(
+            [rngs[i].normal(0.0, cfg.state_noise, (days, batch, 3)) for i in idx], axis=1
+        )
+        draws = np.concatenate([rngs[i].random((days, batch)) for i in idx], axis=1)
+
+        x = np.repeat(x0[idx], batch, axis=0)
+        state = np.repeat(s0[idx], batch)
+        lane_params = {name: np.repeat(values[idx], batch) for name, values in params.items()}
+        first_relapse = np.full(lanes, days, dtype=np.intp)
+
+        for d in range(days):
+            x = np.clip(x + noise[d], 0.0, 1.0)
+            _, c, a, r = engine.simulate_batch(
+                x[:, 0],
+                x[:, 1],
+                x[:, 2],
+                horizon_minutes=1440.0,
+                dt_minutes=cfg.day_dt_minutes,
+                params=lane_params,
+                method="exact",
+            )
+            transitions = markov.transition_matrices(c.mean(axis=1), a.mean(axis=1), r.mean(axis=1))
+            rows = transitions[np.arange(lanes), state].cumsum(axis=1)
+            state = np.minimum((draws[d][:, None] >= rows).sum(axis=1), 2)
+            x = np.stack([c[:, -1], a[:, -1], r[:, -1]], axis=1)
+            first_relapse = np.where(
+                (state == STATE_INDEX[DailyState.S0_SMOKING]) & (first_relapse == days),
+                d,
+                first_relapse,
+            )
+
+        per_user = first_relapse.reshape(idx.shape[0], batch)
+        relapsed[idx] += (per_user[:, :, None] <= np.arange(days)).sum(axis=1)
+        streak_sum[idx] += per_user.sum(axis=1)
+        n_samples[idx] += batch
+
+        lower, upper = _wilson(relapsed[idx], n_samples[idx][:, None])
+        converged = (upper - lower).max(axis=1) / 2.0 <= cfg.ci_halfwidth
+        exhausted = n_samples[idx] >= cfg.max_samples
+        active[idx[converged | exhausted]] = False
+
+    lower, upper = _wilson(relapsed, n_samples[:, None])
+    rows_out = results[start : start + k_users]
+    rows_out[:, :days] = relapsed / n_samples[:, None]
+    rows_out[:, days : 2 * days] = lower
+    rows_out[:, 2 * days : 3 * days] = upper
+    rows_out[:, 3 * days] = streak_sum / n_samples
+    rows_out[:, 3 * days + 1] = n_samples
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,12 @@ from typing import Literal
 
 import numpy as np
 
+from ..config import get_settings
+from .learned_policy import LearnedPolicy, load_learned_policy
 from .ode_engine import CravingODEEngine, ODEParams
+from .schedule_optimizer import ScheduleOptimizer, TaskPlacement
+
+settings = get_settings()
 
 
 @dataclass
@@ -15,13 +20,23 @@ class RLSchedulerConfig:
     threshold_high: float = 0.6
     threshold_low: float = 0.3
     max_tasks_per_hour: int = 4
-    policy: Literal["heuristic"] = "heuristic"
+    policy: Literal["heuristic", "learned", "optimizer"] = settings.rl_scheduler_policy
+    checkpoint_path: str | None = settings.rl_policy_checkpoint_path
+    optimizer_beam_width: int = settings.rl_optimizer_beam_width
+    optimizer_candidate_step_minutes: float = settings.rl_optimizer_candidate_step_minutes
+    optimizer_difficulties: tuple[int, ...] = tuple(settings.rl_optimizer_difficulties)
+    optimizer_task_minutes: float = settings.rl_optimizer_task_minutes
+    optimizer_task_reward: float = settings.rl_optimizer_task_reward
+    optimizer_effort_weight: float = settings.rl_optimizer_effort_weight
+    optimizer_budget_ms: float = settings.rl_optimizer_budget_ms
 
 
 class RLScheduler:
     """
-    Placeholder RL scheduler with a robust deterministic heuristic policy
-    that is compatible with future RL training.
+    RL task scheduler. The default policy is a robust deterministic heuristic;
+    policy="learned" serves a LearnedPolicy checkpoint produced by
+    services.policy_training, which needs no simulation per suggestion, and
+    policy="optimizer" searches task placements with a ScheduleOptimizer.
     """
 
     def __init__(
@@ -31,6 +46,16 @@ class RLScheduler:
     ) -> None:
         self.engine = CravingODEEngine(ode_params)
         self.config = config or RLSchedulerConfig()
+        self.learned: LearnedPolicy | None = None
+        self.optimizer: ScheduleOptimizer | None = None
+        if self.config.policy == "optimizer":
+            self.optimizer = ScheduleOptimizer(self.engine, self.config)
+        if self.config.policy == "learned":
+            if not self.config.checkpoint_path:
+                raise ValueError("policy='learned' requires checkpoint_path.")
+            self.learned = load_learned_policy(self.config.checkpoint_path)
+            if self.learned.horizon_minutes != self.config.horizon_minutes:
+                raise ValueError("Checkpoint horizon does not match horizon_minutes.")
 
     def suggest_task_schedule(
         self,
@@ -43,6 +68,10 @@ class RLScheduler:
         Simple deterministic heuristic: schedule tasks shortly before predicted
         high craving periods, limited by max_tasks_per_hour.
         """
+        if self.learned is not None:
+            return self.learned.suggest(c0, a0, r0)
+        if self.optimizer is not None:
+            return [offset for offset, _ in self.suggest_task_plan(c0, a0, r0)]
         t, c, _, _ = self.engine.simulate(
             c0=c0,
             a0=a0,
@@ -50,15 +79,58 @@ class RLScheduler:
             horizon_minutes=self.config.horizon_minutes,
             dt_minutes=self.config.dt_minutes,
         )
+        return self._select_offsets(t, c)
+
+    def suggest_task_plan(
+        self,
+        c0: float,
+        a0: float,
+        r0: float,
+    ) -> list[TaskPlacement]:
+        """
+        (minute offset, difficulty) pairs of the optimizer's best schedule.
+        """
+        if self.optimizer is None:
+            raise ValueError("suggest_task_plan requires policy='optimizer'.")
+        return self.optimizer.optimize(c0, a0, r0).tasks
+
+    def suggest_task_schedule_batch(
+        self,
+        c0: np.ndarray,
+        a0: np.ndarray,
+        r0: np.ndarray,
+    ) -> list[list[int]]:
+        """
+        Same policy as suggest_task_schedule for N initial states, simulated
+        together with CravingODEEngine.simulate_batch.
+        """
+        if self.learned is not None:
+            return self.learned.suggest_batch(c0, a0, r0)
+        if self.optimizer is not None:
+            return [self.suggest_task_schedule(c, a, r) for c, a, r in zip(c0, a0, r0)]
+        t, c, _, _ = self.engine.simulate_batch(
+            c0=c0,
+            a0=a0,
+            r0=r0,
+            horizon_minutes=self.config.horizon_minutes,
+            dt_minutes=self.config.dt_minutes,
+        )
+        return [self._select_offsets(t, row) for row in c]
+
+    def _select_offsets(self, t: np.ndarray, c: np.ndarray) -> list[int]:
         task_indices: list[int] = []
         last_task_idx = -9999
         step_minutes = self.config.dt_minutes
         min_gap_steps = max(1, int(60.0 / (self.config.max_tasks_per_hour * step_minutes)))
 
-        for idx in range(1, len(t) - 1):
-            if c[idx] >= self.config.threshold_high and c[idx] > c[idx - 1]:
-                if idx - last_task_idx >= min_gap_steps:
-                    task_indices.append(idx)
-                    last_task_idx = idx
+        # Rising crossings of threshold_high are the only candidates, so the
+        # gap scan below visits a handful of indices instead of every step.
+        inner = c[1:-1]
+        candidates = np.flatnonzero((inner >= self.config.threshold_high) & (inner > c[:-2])) + 1
+
+        for idx in candidates.tolist():
+            if idx - last_task_idx >= min_gap_steps:
+                task_indices.append(idx)
+                last_task_idx = idx
 
         return [int(t[i]) for i in task_indices[: self.config.max_tasks_per_hour]]
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .ode_engine import CravingODEEngine
+
+if TYPE_CHECKING:
+    from .rl_scheduler import RLSchedulerConfig
+
+# (minute offset, difficulty 1-10)
+TaskPlacement = tuple[int, int]
+
+
+@dataclass
+class SchedulePlan:
+    tasks: list[TaskPlacement]
+    objective: float
+    evaluated: int
+    depth: int
+
+
+class ScheduleOptimizer:
+    """
+    Beam search over task placements, scored by simulating them.
+
+    A task at offset k with difficulty d drives u = d / 10 for task_minutes
+    and then adds task_reward to R. Depth n extends each of the beam_width
+    best n-task schedules with one more task at every later candidate offset
+    (at least 60 / max_tasks_per_hour minutes after its last task) and every
+    candidate difficulty. All extensions of a depth are simulated together in
+    one simulate_batch(method="exact") call and scored by integrated craving
+    plus effort_weight per effort-minute (u x minutes). The best schedule
+    seen at any depth, including the empty one, is returned. The search stops
+    after the first depth that ends past budget_ms.
+    """
+
+    def __init__(self, engine: CravingODEEngine, config: RLSchedulerConfig) -> None:
+        self.engine = engine
+        self.config = config
+        cfg = config
+        self.n_steps = int(cfg.horizon_minutes / cfg.dt_minutes) + 1
+        self.task_steps = max(1, int(round(cfg.optimizer_task_minutes / cfg.dt_minutes)))
+        self.gap_steps = max(1, int(np.ceil(60.0 / (cfg.max_tasks_per_hour * cfg.dt_minutes))))
+        self.max_tasks = max(1, int(cfg.max_tasks_per_hour * cfg.horizon_minutes / 60.0))
+        stride = max(1, int(round(cfg.optimizer_candidate_step_minutes / cfg.dt_minutes)))
+        # A task must finish inside the horizon for its reward to count.
+        self.candidates = np.arange(0, self.n_steps - self.task_steps, stride)
+
+    def optimize(self, c0: float, a0: float, r0: float) -> SchedulePlan:
+        cfg = self.config
+        deadline = time.perf_counter() + cfg.optimizer_budget_ms / 1000.0
+
+        baseline = float(self._score([[]], c0, a0, r0)[0])
+        best = SchedulePlan(tasks=[], objective=baseline, evaluated=1, depth=0)
+        beam: list[list[tuple[int, int]]] = [[]]  # (grid index, difficulty)
+        for depth in range(1, self.max_tasks + 1):
+            children = [
+                plan + [(int(idx), d)]
+                for plan in beam
+                for idx in self.candidates
+                if not plan or idx - plan[-1][0] >= self.gap_steps
+                for d in cfg.optimizer_difficulties
+            ]
+            if not children:
+                break
+            scores = self._score(children, c0, a0, r0)
+            best.evaluated += len(children)
+            order = np.argsort(scores, kind="stable")[: cfg.optimizer_beam_width]
+            beam = [children[i] for i in order]
+            if scores[order[0]] < best.objective:
+                best.objective = float(scores[order[0]])
+                best.tasks = [(int(round(idx * cfg.dt_minutes)), d) for idx, d in beam[0]]
+                best.depth = depth
+            if time.perf_counter() >= deadline:
+                break
+        return best
+
+    def _score(self, plans: list[list[tuple[int, int]]], c0: float, a0: float, r0: float) -> np.ndarray:
+        cfg = self.config
+        n = len(plans)
+        u = np.zeros((n, self.n_steps))
+        reward = np.zeros((n, self.n_steps))
+        effort = np.zeros(n)
+        for k, plan in enumerate(plans):
+            for idx, difficulty in plan:
+                level = difficulty / 10.0
+                u[k, idx : idx + self.task_steps] = level
+                # reward_pulses[j] lands on grid point j + 1.
+                reward[k, idx + self.task_steps - 1] += cfg.optimizer_task_reward
+                effort[k] += level * self.task_steps * cfg.dt_minutes
+        _, c, _, _ = self.engine.simulate_batch(
+            np.full(n, c0),
+            np.full(n, a0),
+            np.full(n, r0),
+            horizon_minutes=cfg.horizon_minutes,
+            dt_minutes=cfg.dt_minutes,
+            u_schedule=u,
+            reward_pulses=reward,
+            method="exact",
+        )
+        craving = 0.5 * (c[:, 1:] + c[:, :-1]).sum(axis=1) * cfg.dt_minutes
+        return craving + cfg.optimizer_effort_weight * effort
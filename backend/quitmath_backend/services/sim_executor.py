@@ -0,0 +1,126 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Any, Callable, Literal
+
+from ..config import get_settings
+
+
+class ExecutorOverloaded(Exception):
+    """
+    Raised when the pool and its bounded queue are full.
+    """
+
+
+class ComputeBudgetExceeded(Exception):
+    """
+    Raised when a single request asks for more simulation steps than allowed.
+    """
+
+
+class SimulationExecutor:
+    """
+    Runs CPU-bound simulations off the event loop on a bounded pool.
+
+    At most max_workers jobs run and max_queue more may wait; anything beyond
+    that is rejected immediately instead of queueing without bound, so
+    lightweight endpoints keep their latency while heavy simulations run.
+    Process pools use the spawn start method and must be given module-level
+    (picklable) callables.
+    """
+
+    def __init__(
+        self,
+        kind: Literal["process", "thread"] = "process",
+        max_workers: int | None = None,
+        max_queue: int = 32,
+        max_steps_per_request: int = 200_000,
+    ) -> None:
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.max_steps_per_request = max_steps_per_request
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._pool: Executor | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.in_flight - self.max_workers)
+
+    def check_budget(self, n_steps: int) -> None:
+        if n_steps > self.max_steps_per_request:
+            self.rejected += 1
+            raise ComputeBudgetExceeded(
+                f"Requested {n_steps} steps; the limit is {self.max_steps_per_request}."
+            )
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            if self.in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorOverloaded("Simulation capacity exhausted; retry shortly.")
+            self.in_flight += 1
+        completed = False
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_pool(), partial(fn, *args, **kwargs))
+            completed = True
+            return result
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                if completed:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _get_pool(self) -> Executor:
+        with self._lock:
+            if self._pool is None:
+                if self.kind == "process":
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                else:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="quitmath-sim",
+                    )
+            return self._pool
+
+
+@lru_cache
+def get_simulation_executor() -> SimulationExecutor:
+    settings = get_settings()
+    return SimulationExecutor(
+        kind=settings.sim_executor_kind,
+        max_workers=settings.sim_executor_workers,
+        max_queue=settings.sim_executor_max_queue,
+        max_steps_per_request=settings.sim_max_steps_per_request,
+    )
@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Iterable, Mapping
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..database import AsyncSessionLocal, dialect_insert
+from ..models import CravingLog, TaskLog, User, UserLatentState
+from .ode_engine import CravingODEEngine, ODEParams
+from .user_params import load_user_params
+
+# Upper-triangular covariance entries persisted per snapshot.
+_COV_COLUMNS = ("p_cc", "p_ca", "p_cr", "p_aa", "p_ar", "p_rr")
+_COV_INDEX = np.triu_indices(3)
+_PRIOR_MEAN = (0.5, 0.5, 0.0)
+
+
+@dataclass
+class StateEvent:
+    """
+    One log's effect on a user's latent state. A craving observes C (score)
+    and optionally A (attention), scaled from 0-10 to [0, 1]; a task drives
+    u = difficulty / 10 from started_at to at and then adds reward_delta to R.
+    """
+
+    user_id: int
+    at: datetime
+    c: float | None = None
+    a: float | None = None
+    started_at: datetime | None = None
+    u: float = 0.0
+    reward: float = 0.0
+
+    @classmethod
+    def from_row(cls, model: type, row: Mapping[str, Any]) -> StateEvent | None:
+        if model is CravingLog:
+            attention = row.get("attention")
+            return cls(
+                user_id=row["user_id"],
+                at=row["timestamp"],
+                c=row["score"] / 10.0,
+                a=attention / 10.0 if attention is not None else None,
+            )
+        if model is TaskLog:
+            completed_at = row.get("completed_at")
+            if completed_at is None:
+                return None
+            return cls(
+                user_id=row["user_id"],
+                at=completed_at,
+                started_at=row["started_at"],
+                u=row["difficulty"] / 10.0,
+                reward=row["reward_delta"] or 0.0,
+            )
+        return None
+
+    @classmethod
+    def from_log(cls, log: Any) -> StateEvent | None:
+        model = type(log)
+        return cls.from_row(model, {c.key: getattr(log, c.key) for c in model.__mapper__.column_attrs})
+
+
+@dataclass
+class LatentEstimate:
+    x: np.ndarray    # (C, A, R)
+    cov: np.ndarray  # 3x3
+    at: datetime
+
+    @classmethod
+    def from_row(cls, row: UserLatentState) -> LatentEstimate:
+        cov = np.zeros((3, 3))
+        cov[_COV_INDEX] = [getattr(row, name) for name in _COV_COLUMNS]
+        cov = cov + np.triu(cov, 1).T
+        return cls(x=np.array([row.c, row.a, row.r], dtype=float), cov=cov, at=row.updated_at)
+
+    def to_values(self) -> dict[str, Any]:
+        values = dict(zip(_COV_COLUMNS, self.cov[_COV_INDEX].tolist()))
+        values.update(c=float(self.x[0]), a=float(self.x[1]), r=float(self.x[2]), updated_at=self.at)
+        return values
+
+
+class LatentStateEstimator:
+    """
+    Per-user extended Kalman filter over the craving ODE.
+
+    Between logs the mean follows the clipped linear dynamics with the user's
+    calibrated parameters, advanced in at most max_substeps matrix-exponential
+    steps (halving any step that overflows) so a long gap costs O(log gap);
+    components pinned at a [0, 1] bound are frozen as in CravingODEEngine, and
+    the covariance is carried by the same propagator plus process_noise per
+    minute, capped at initial_variance per component. Cravings are then folded
+    in as measurements of C and A. Each snapshot (mean, covariance and its
+    timestamp) is upserted in the caller's transaction, so restarts resume
+    from it. Logs older than a user's snapshot are applied at the snapshot
+    time rather than replayed.
+    """
+
+    def __init__(
+        self,
+        process_noise: float = 1e-4,
+        measurement_noise: float = 0.1,
+        initial_variance: float = 0.25,
+        max_substeps: int = 16,
+        substep_minutes: float = 15.0,
+    ) -> None:
+        self.process_noise = process_noise
+        self.measurement_var = measurement_noise**2
+        self.initial_variance = initial_variance
+        self.max_substeps = max_substeps
+        self.substep_minutes = substep_minutes
+
+    def prior(self, at: datetime) -> LatentEstimate:
+        return LatentEstimate(
+            x=np.array(_PRIOR_MEAN, dtype=float),
+            cov=np.eye(3) * self.initial_variance,
+            at=at,
+        )
+
+    def predict(
+        self,
+        estimate: LatentEstimate,
+        params: ODEParams,
+        until: datetime,
+        u: float = 0.0,
+    ) -> LatentEstimate:
+        minutes = (until - estimate.at).total_seconds() / 60.0
+        if minutes <= 0.0:
+            return estimate
+
+        engine = CravingODEEngine(params)
+        n_sub = min(self.max_substeps, max(1, int(np.ceil(minutes / self.substep_minutes))))
+        x, cov = estimate.x.copy(), estimate.cov
+        pending = [minutes / n_sub] * n_sub
+        while pending:
+            h = pending.pop()
+            with np.errstate(over="ignore", invalid="ignore"):
+                phi = engine.step_propagator(x, u, h)
+                step_cov = phi[:3, :3] @ cov @ phi[:3, :3].T
+            if not np.isfinite(step_cov).all() and h > self.substep_minutes:
+                # An unpinned unstable mode overflowed over the whole step;
+                # take it in halves so the first can reach a bound and freeze.
+                pending += [h / 2.0, h / 2.0]
+                continue
+            x = np.clip(phi[:3, :3] @ x + phi[:3, 3], 0.0, 1.0)
+            cov = self._cap(step_cov + np.eye(3) * self.process_noise * h)
+        return LatentEstimate(x=x, cov=cov, at=until)
+
+    def _cap(self, cov: np.ndarray) -> np.ndarray:
+        # C and A reinforce each other (a saddle only the clip bounds), so the
+        # linearized covariance can grow without limit; cap each component at
+        # the prior variance, keeping the correlations.
+        scale = np.sqrt(np.minimum(1.0, self.initial_variance / np.maximum(cov.diagonal(), 1e-300)))
+        return cov * np.outer(scale, scale)
+
+    def update(self, estimate: LatentEstimate, c: float | None, a: float | None) -> LatentEstimate:
+        rows = [i for i, value in ((0, c), (1, a)) if value is not None]
+        if not rows:
+            return estimate
+        z = np.array([c, a], dtype=float)[rows]
+        h = np.eye(3)[rows]
+        cov = estimate.cov
+        s = h @ cov @ h.T + np.eye(len(rows)) * self.measurement_var
+        gain = np.linalg.solve(s, h @ cov).T
+        x = np.clip(estimate.x + gain @ (z - h @ estimate.x), 0.0, 1.0)
+        # Joseph form keeps the covariance symmetric positive semi-definite.
+        i_kh = np.eye(3) - gain @ h
+        cov = i_kh @ cov @ i_kh.T + gain @ gain.T * self.measurement_var
+        return LatentEstimate(x=x, cov=cov, at=estimate.at)
+
+    def step(self, estimate: LatentEstimate | None, params: ODEParams, event: StateEvent) -> LatentEstimate:
+        if estimate is None:
+            estimate = self.prior(event.started_at or event.at)
+        if event.started_at is not None and event.started_at < event.at:
+            estimate = self.predict(estimate, params, event.started_at)
+            estimate = self.predict(estimate, params, event.at, u=event.u)
+        else:
+            estimate = self.predict(estimate, params, event.at)
+        if event.reward:
+            x = estimate.x.copy()
+            x[2] = min(1.0, max(0.0, x[2] + event.reward))
+            estimate = LatentEstimate(x=x, cov=estimate.cov, at=estimate.at)
+        return self.update(estimate, event.c, event.a)
+
+    async def apply(self, session: AsyncSession, events: Iterable[StateEvent | None]) -> None:
+        """
+        Folds events into each user's snapshot inside the session's
+        transaction; the caller commits.
+        """
+        by_user: dict[int, list[StateEvent]] = defaultdict(list)
+        for event in events:
+            if event is not None:
+                by_user[event.user_id].append(event)
+
+        for user_id in sorted(by_user):
+            row = await session.scalar(
+                select(UserLatentState)
+                .where(UserLatentState.user_id == user_id)
+                .with_for_update()
+                .execution_options(populate_existing=True)
+            )
+            estimate = LatentEstimate.from_row(row) if row is not None else None
+            params = await load_user_params(session, user_id)
+            for event in sorted(by_user[user_id], key=lambda e: e.at):
+                estimate = self.step(estimate, params, event)
+            await self._save(session, user_id, estimate)
+
+    async def current(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        now: datetime | None = None,
+    ) -> LatentEstimate | None:
+        """
+        The user's snapshot predicted forward to now, or None before their
+        first log. Nothing is written.
+        """
+        row = await session.get(UserLatentState, user_id, populate_existing=True)
+        if row is None:
+            return None
+        params = await load_user_params(session, user_id)
+        return self.predict(LatentEstimate.from_row(row), params, now or datetime.utcnow())
+
+    async def rebuild(self, users_per_chunk: int = 500) -> int:
+        """
+        Replays every user's craving and task logs into fresh snapshots, one
+        transaction per chunk of users. Returns the number of snapshots written.
+        """
+        written = 0
+        last_id = 0
+        while True:
+            async with AsyncSessionLocal() as session:
+                user_ids = (
+                    await session.scalars(
+                        select(User.id).where(User.id > last_id).order_by(User.id).limit(users_per_chunk)
+                    )
+                ).all()
+                if not user_ids:
+                    return written
+                last_id = user_ids[-1]
+
+                estimates: dict[int, LatentEstimate] = {}
+                params = {uid: await load_user_params(session, uid) for uid in user_ids}
+                for event in await self._logged_events(session, user_ids):
+                    estimates[event.user_id] = self.step(
+                        estimates.get(event.user_id), params[event.user_id], event
+                    )
+                for user_id, estimate in estimates.items():
+                    await self._save(session, user_id, estimate)
+                await session.commit()
+                written += len(estimates)
+
+    async def _logged_events(self, session: AsyncSession, user_ids: list[int]) -> list[StateEvent]:
+        events: list[StateEvent | None] = []
+        for model, order in ((CravingLog, CravingLog.timestamp), (TaskLog, TaskLog.started_at)):
+            columns = [c.key for c in model.__mapper__.column_attrs]
+            result = await session.execute(
+                select(*(getattr(model, key) for key in columns))
+                .where(model.user_id.in_(user_ids))
+                .order_by(model.user_id, order)
+            )
+            events.extend(StateEvent.from_row(model, row._mapping) for row in result)
+        return sorted((e for e in events if e is not None), key=lambda e: (e.user_id, e.at))
+
+    async def _save(self, session: AsyncSession, user_id: int, estimate: LatentEstimate) -> None:
+        values = estimate.to_values()
+        stmt = dialect_insert(session, UserLatentState).values(user_id=user_id, **values)
+        stmt = stmt.on_conflict_do_update(index_elements=["user_id"], set_=values)
+        await session.execute(stmt)
+
+
+@lru_cache
+def get_state_estimator() -> LatentStateEstimator:
+    settings = get_settings()
+    return LatentStateEstimator(
+        process_noise=settings.state_process_noise,
+        measurement_noise=settings.state_measurement_noise,
+        initial_variance=settings.state_initial_variance,
+        max_substeps=settings.state_max_substeps,
+        substep_minutes=settings.state_substep_minutes,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild latent-state snapshots from raw logs.")
+    parser.add_argument("--users-per-chunk", type=int, default=500)
+    args = parser.parse_args()
+    written = asyncio.run(get_state_estimator().rebuild(args.users_per_chunk))
+    print(f"wrote {written} latent-state snapshots")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import astuple
+from functools import lru_cache
+from typing import Any, Callable, Hashable
+
+from ..config import get_settings
+
+
+def params_fingerprint(*params: Any) -> str:
+    """
+    Stable short hash of one or more parameter dataclasses, used in cache keys
+    so results computed under different dynamics never collide.
+    """
+    raw = repr(tuple(astuple(p) for p in params if p is not None))
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class TrajectoryCache:
+    """
+    In-process LRU cache with per-entry TTL for simulation and schedule results.
+
+    Keys are tuples whose last element is a params_fingerprint(), which lets
+    invalidate_fingerprint() drop everything computed under a parameter set
+    once a user's parameters change.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 300.0,
+        state_step: float = 0.01,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.state_step = state_step
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def quantize(self, value: float) -> float:
+        """
+        Snaps a state coordinate to the cache grid; callers simulate from the
+        snapped value so a cached entry is exactly what a miss would compute.
+        """
+        steps = round(value / self.state_step)
+        return round(min(1.0, max(0.0, steps * self.state_step)), 10)
+
+    def get(self, key: Hashable) -> Any | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def invalidate_fingerprint(self, fingerprint: str) -> int:
+        with self._lock:
+            stale = [k for k in self._entries if k[-1] == fingerprint]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+@lru_cache
+def get_trajectory_cache() -> TrajectoryCache:
+    settings = get_settings()
+    return TrajectoryCache(
+        max_entries=settings.rl_cache_max_entries,
+        ttl_seconds=settings.rl_cache_ttl_seconds,
+        state_step=settings.rl_cache_state_step,
+    )
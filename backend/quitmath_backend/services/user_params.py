@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import fields
+from functools import lru_cache
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..models import UserODEParams
+from .ode_engine import ODEParams
+
+
+class UserParamsCache:
+    """
+    Bounded LRU of user id -> ODEParams with a TTL, so personalized dynamics
+    cost one primary-key lookup per user per TTL rather than per request.
+    Calibration invalidates a user as soon as new parameters are stored.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl_seconds: float = 300.0) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[int, tuple[float, ODEParams]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> ODEParams | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < now:
+                self._entries.pop(user_id, None)
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, user_id: int, params: ODEParams) -> None:
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl_seconds, params)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+@lru_cache
+def get_user_params_cache() -> UserParamsCache:
+    settings = get_settings()
+    return UserParamsCache(
+        max_entries=settings.user_params_cache_max_entries,
+        ttl_seconds=settings.user_params_cache_ttl_seconds,
+    )
+
+
+def row_to_params(row: UserODEParams) -> ODEParams:
+    return ODEParams(**{f.name: getattr(row, f.name) for f in fields(ODEParams)})
+
+
+async def load_user_params(session: AsyncSession, user_id: int) -> ODEParams:
+    """
+    The user's calibrated ODEParams, or the global defaults when they have
+    not been calibrated yet.
+    """
+    cache = get_user_params_cache()
+    params = cache.get(user_id)
+    if params is None:
+        row = await session.get(UserODEParams, user_id)
+        params = row_to_params(row) if row is not None else ODEParams()
+        cache.put(user_id, params)
+    return params
@@ -0,0 +1,139 @@
+import asyncio
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from ..config import get_settings
+from ..database import AsyncSessionLocal
+from .daily_aggregator import DailyDelta, get_daily_aggregator
+from .live_updates import get_live_hub
+from .state_estimator import StateEvent, get_state_estimator
+
+
+class WriteBehindBuffer:
+    """
+    Coalesces single-row inserts from concurrent requests into group commits.
+
+    Rows wait until max_rows are pending or max_latency_ms has passed since
+    the first one arrived, then every pending row is written in one
+    transaction (one INSERT ... RETURNING per table, plus the DailySession
+    and latent-state updates for the group) and each waiting request gets
+    its own id back. Failed flushes propagate the error to every request in
+    the group. close() flushes whatever is left; rows submitted after that
+    are committed immediately.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker = AsyncSessionLocal,
+        max_rows: int = 256,
+        max_latency_ms: float = 5.0,
+    ) -> None:
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.max_latency_ms = max_latency_ms
+        self.flushes = 0
+        self.rows_written = 0
+        self._pending: list[tuple[Any, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._flush_lock = asyncio.Lock()
+        self._closed = False
+
+    async def submit(self, obj: Any) -> Any:
+        """
+        Queues a transient ORM object for insertion and returns it with its
+        primary key set once the group containing it has committed.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((obj, future))
+
+        if self._closed or len(self._pending) >= self.max_rows:
+            self._cancel_timer()
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_latency_ms / 1000.0, self._schedule_flush)
+
+        obj.id = await future
+        return obj
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            self._cancel_timer()
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                ids = await self._write(batch)
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                return
+            self.flushes += 1
+            self.rows_written += len(batch)
+            for (_, future), row_id in zip(batch, ids):
+                if not future.done():
+                    future.set_result(row_id)
+
+    async def close(self) -> None:
+        self._closed = True
+        await self.flush()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "max_rows": self.max_rows,
+            "max_latency_ms": self.max_latency_ms,
+        }
+
+    async def _write(self, batch: list[tuple[Any, asyncio.Future]]) -> list[int]:
+        by_model: dict[type, list[int]] = defaultdict(list)
+        for position, (obj, _) in enumerate(batch):
+            by_model[type(obj)].append(position)
+
+        ids: list[int] = [0] * len(batch)
+        deltas: list[DailyDelta | None] = []
+        events: list[StateEvent | None] = []
+        async with self.session_factory() as session:
+            for model, positions in by_model.items():
+                columns = [c.key for c in model.__mapper__.column_attrs if c.key != "id"]
+                rows = [{key: getattr(batch[p][0], key) for key in columns} for p in positions]
+                result = await session.execute(
+                    insert(model).returning(model.id, sort_by_parameter_order=True), rows
+                )
+                for position, row_id in zip(positions, result.scalars().all()):
+                    ids[position] = row_id
+                deltas.extend(DailyDelta.from_row(model, row) for row in rows)
+                events.extend(StateEvent.from_row(model, row) for row in rows)
+            await get_daily_aggregator().apply(session, deltas)
+            await get_state_estimator().apply(session, events)
+            await session.commit()
+        get_live_hub().publish(event.user_id for event in events if event is not None)
+        return ids
+
+    def _schedule_flush(self) -> None:
+        self._timer = None
+        task = asyncio.get_running_loop().create_task(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+@lru_cache
+def get_write_buffer() -> WriteBehindBuffer:
+    settings = get_settings()
+    return WriteBehindBuffer(
+        max_rows=settings.write_buffer_max_rows,
+        max_latency_ms=settings.write_buffer_max_latency_ms,
+    )